@@ -0,0 +1,198 @@
+"""Headless trial balance analysis shared by the Streamlit app and the batch CLI.
+
+``analyze_trial_balance`` takes a normalized trial balance (see
+``ingest.load_trial_balance``) and returns a ``TrialBalanceAnalysis`` with the
+change tables, the category filters, the significant changes, the summary
+findings and the Excel report writer. Significant changes are limited to
+months that are anomalous against the account's own rolling and
+same-month-last-year baselines (see ``anomaly.py``). Nothing here depends on
+Streamlit.
+"""
+import numpy as np
+import pandas as pd
+
+from anomaly import DEFAULT_ANOMALY_SETTINGS, score_trial_balance
+from changes import build_change_frames
+from classifier import CategoryClassifier
+from export import write_analysis_report
+from profiling import profile_stage
+from rollup import AccountHierarchy, rollup_changes
+from significant import SCORE_COLUMN, find_significant_changes
+from styling import DEFAULT_THRESHOLDS, band_matrix
+
+# Sheet labels of the category groups in the Excel report
+CATEGORY_LABELS = {"expense": "Biaya", "pinjaman": "Pinjaman", "simpanan": "Simpanan"}
+
+SUMMARY_TEMPLATES = {
+    "expense": "1. Perubahan biaya terbesar terjadi pada kategori '{Kategori}' pada periode {Periode} dengan perubahan {pct}%.",
+    "pinjaman": "2. Pinjaman mengalami perubahan signifikan pada kategori '{Kategori}' pada periode {Periode} dengan perubahan {pct}%.",
+    "simpanan": "3. Simpanan mengalami perubahan signifikan pada kategori '{Kategori}' pada periode {Periode} dengan perubahan {pct}%.",
+}
+
+REPORT_TEMPLATE = """
+Berdasarkan Trial Balance secara time series pada periode {first_month} s.d. {last_month}, dapat dilihat beberapa anomali/ketidakwajaran dengan penjelasan singkat sebagai berikut:
+
+1. Analisis Biaya Operasional:
+   - Kategori biaya dengan perubahan terbesar adalah pada akun yang terkait dengan pengeluaran operasional.
+   - Terdapat fluktuasi signifikan pada beberapa bulan tertentu yang perlu diperhatikan.
+
+2. Analisis Pinjaman:
+   - Pinjaman mengalami perubahan dinamis selama periode pengamatan.
+   - Perlu perhatian khusus pada kenaikan/penurunan yang terjadi secara ekstrem.
+
+3. Analisis Simpanan:
+   - Simpanan juga menunjukkan tren perubahan yang perlu dimonitor.
+   - Beberapa perubahan ekstrem dapat mengindikasikan pergerakan dana yang tidak biasa.
+
+Rekomendasi:
+- Lakukan pemeriksaan lebih lanjut terhadap perubahan ekstrem yang terjadi.
+- Buat mekanisme monitoring yang lebih ketat untuk kategori biaya yang sering mengalami fluktuasi.
+- Evaluasi kebijakan pinjaman dan simpanan untuk memastikan kestabilan keuangan.
+"""
+
+
+class TrialBalanceAnalysis:
+    """Computed analysis of one normalized trial balance."""
+
+    def __init__(self, df, month_columns, changes_df, absolute_changes_df, category_filters, incremental_result=None,
+                 thresholds=DEFAULT_THRESHOLDS, anomaly_settings=DEFAULT_ANOMALY_SETTINGS):
+        self.df = df
+        self.month_columns = month_columns
+        self.changes_df = changes_df
+        self.absolute_changes_df = absolute_changes_df
+        self.category_filters = category_filters
+        self.incremental_result = incremental_result
+        self.thresholds = thresholds
+        self.anomaly_settings = anomaly_settings
+        self._anomaly_scores = None
+        self._bands = None
+        self._change_masks = {}
+        self._hierarchy = None
+        self._rollups = None
+        self._rollup_bands = {}
+
+    def category_df(self, group):
+        return self.df[self.category_filters[group]]
+
+    def category_changes_mask(self, group):
+        """Rows of ``changes_df`` that belong to one category group."""
+        if group not in self._change_masks:
+            accounts = self.category_df(group)['No Akun']
+            self._change_masks[group] = self.changes_df['No Akun'].isin(accounts).to_numpy()
+        return self._change_masks[group]
+
+    def category_rows(self, group):
+        """Row positions of one category group in ``changes_df`` and ``absolute_changes_df``."""
+        return np.flatnonzero(self.category_changes_mask(group))
+
+    def change_bands(self):
+        """Color bands of every percentage change, computed once for the whole matrix."""
+        if self._bands is None:
+            pct_cols = [col for col in self.changes_df.columns if "Perubahan" in col]
+            self._bands = band_matrix(self.changes_df[pct_cols], self.thresholds)
+        return self._bands
+
+    def hierarchy(self):
+        """Account groups derived from the "No Akun" prefixes, computed once."""
+        if self._hierarchy is None:
+            self._hierarchy = AccountHierarchy(self.df['No Akun'])
+        return self._hierarchy
+
+    def rollup(self, level):
+        """``(rollup_df, changes_df, absolute_changes_df)`` of the account groups at ``level``.
+
+        All levels are aggregated together on first use.
+        """
+        if self._rollups is None:
+            with profile_stage("rollup", rows=len(self.df), months=len(self.month_columns)):
+                self._rollups = rollup_changes(self.df, self.month_columns, self.hierarchy())
+        return self._rollups[level]
+
+    def rollup_bands(self, level):
+        """Color bands of the percentage changes of the account groups at ``level``."""
+        if level not in self._rollup_bands:
+            changes_df = self.rollup(level)[1]
+            pct_cols = [col for col in changes_df.columns if "Perubahan" in col]
+            self._rollup_bands[level] = band_matrix(changes_df[pct_cols], self.thresholds)
+        return self._rollup_bands[level]
+
+    def anomaly_scores(self):
+        """Rolling-baseline anomaly scores of every account and month, or None when scoring is off."""
+        if self._anomaly_scores is None and self.anomaly_settings is not None:
+            with profile_stage("anomaly", rows=len(self.df), months=len(self.month_columns)):
+                self._anomaly_scores = score_trial_balance(self.df, self.month_columns, self.anomaly_settings)
+        return self._anomaly_scores
+
+    def significant_changes(self, group, top_k=None):
+        """Significant changes of one category group in anomalous months, largest first."""
+        category_filter = self.category_filters[group]
+        anomaly_scores = self.anomaly_scores()
+        scores, min_score = None, None
+        if anomaly_scores is not None:
+            scores, min_score = anomaly_scores.pair_scores(), self.anomaly_settings.min_score
+        with profile_stage("significant", rows=len(self.changes_df), months=len(self.month_columns), group=group):
+            if self.incremental_result is not None:
+                return self.incremental_result.significant_changes(category_filter, scores=scores,
+                                                                   min_score=min_score, top_k=top_k)
+            return find_significant_changes(self.changes_df, category_filter, top_k=top_k, scores=scores,
+                                            min_score=min_score)
+
+    def all_significant_changes(self):
+        return pd.concat([self.significant_changes(group) for group in self.category_filters])
+
+    def summary_findings(self):
+        """The "Temuan Utama" lines: the largest significant change per category."""
+        findings = []
+        for group, template in SUMMARY_TEMPLATES.items():
+            if group not in self.category_filters:
+                continue
+            top = self.significant_changes(group, top_k=1)
+            if not top.empty:
+                row = top.iloc[0]
+                finding = template.format(Kategori=row['Kategori'], Periode=row['Periode'], pct=row['Perubahan (%)'])
+                if pd.notna(row.get(SCORE_COLUMN)):
+                    finding += f" Skor anomali {row[SCORE_COLUMN]:.1f} terhadap baseline {self.anomaly_settings.window} bulan."
+                findings.append(finding)
+        return findings
+
+    def default_report_text(self):
+        return REPORT_TEMPLATE.format(first_month=self.month_columns[0], last_month=self.month_columns[-1])
+
+    def write_excel_report(self, path, report_text=None, progress=None):
+        """Stream the full Excel report to ``path``; see ``export.write_analysis_report`` for ``progress``."""
+        category_filters = {
+            CATEGORY_LABELS.get(group, group): category_filter
+            for group, category_filter in self.category_filters.items()
+        }
+        significant_changes = self.all_significant_changes()
+        rollups = {level: self.rollup(level)[:2] for level in range(1, self.hierarchy().depth + 1)}
+        with profile_stage("excel_export", rows=len(self.df), months=len(self.month_columns)):
+            return write_analysis_report(
+                path, self.df, self.month_columns, self.changes_df, self.absolute_changes_df,
+                category_filters, significant_changes,
+                self.default_report_text() if report_text is None else report_text,
+                thresholds=self.thresholds, rollups=rollups, progress=progress,
+            )
+
+
+def analyze_trial_balance(df, month_columns, classifier=None, incremental_result=None, thresholds=DEFAULT_THRESHOLDS,
+                          anomaly_settings=DEFAULT_ANOMALY_SETTINGS):
+    """Run the change calculation and category classification on ``df``.
+
+    Pass the result of ``incremental.analyze_incremental`` as
+    ``incremental_result`` to reuse its change tables and significant changes.
+    ``thresholds`` sets the color bands of the percentage changes.
+    ``anomaly_settings`` configures the anomaly scores that filter the
+    significant changes; None keeps every change above the threshold.
+    """
+    with profile_stage("changes", rows=len(df), months=len(month_columns)):
+        if incremental_result is not None:
+            changes_df, absolute_changes_df = incremental_result.change_frames()
+        else:
+            changes_df, absolute_changes_df = build_change_frames(df, month_columns)
+
+    classifier = classifier if classifier is not None else CategoryClassifier()
+    with profile_stage("classify", rows=len(df)):
+        category_filters = classifier.masks(df['Keterangan'])
+    return TrialBalanceAnalysis(df, month_columns, changes_df, absolute_changes_df, category_filters, incremental_result,
+                                thresholds, anomaly_settings)
@@ -0,0 +1,191 @@
+"""Rolling-baseline anomaly scores of every account and month.
+
+A fixed threshold on the change from the previous month flags every swing of
+a seasonal account ("Simpanan Hari Raya", "Simpanan Qurban") each year.
+``score_anomalies`` instead compares each month with the account's own
+history, for all accounts at once over the 2-D month matrix:
+
+- the preceding ``window`` months are viewed as strided windows
+  (``sliding_window_view``, no copies), giving the rolling mean, median and
+  MAD (median absolute deviation) of every cell
+- the robust scale of a cell is ``1.4826 * MAD``, floored at
+  ``relative_floor`` of the larger of the median and the cell's value, so
+  flat histories don't make every small move infinite and an account moving
+  off an all-zero history scores ``1 / relative_floor`` (100), not its
+  amount in rupiah
+- the rolling score is ``|value - median| / scale``; the seasonal score is
+  ``|value - same month last year| / scale``
+- the anomaly score is the smaller of the two, so a month that repeats last
+  year's seasonal swing is not an anomaly
+
+Cells with fewer than ``min_periods`` months of history have no score (NaN).
+Rows are processed in chunks to bound the size of the sorted windows.
+
+Run ``python anomaly.py --benchmark`` to time it on 100k accounts x 60 months.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Scales the MAD to the standard deviation of normally distributed data
+MAD_SCALE = 1.4826
+DEFAULT_CHUNK_ROWS = 10000
+
+
+class AnomalySettings:
+    """Baseline window, seasonal lag and score cutoff of the anomaly engine."""
+
+    def __init__(self, window=12, min_periods=6, min_score=3.5, season=12, relative_floor=0.01):
+        if not 1 <= min_periods <= window:
+            raise ValueError("Settings must satisfy 1 <= min_periods <= window")
+        self.window = window
+        self.min_periods = min_periods
+        self.min_score = min_score
+        self.season = season
+        self.relative_floor = relative_floor
+
+    @classmethod
+    def from_env(cls, window_var="TB_ANOMALY_WINDOW", min_score_var="TB_ANOMALY_MIN_SCORE"):
+        """Settings from the environment, falling back to the defaults."""
+        window = int(os.environ.get(window_var, 12))
+        return cls(window=window, min_periods=min(6, window), min_score=float(os.environ.get(min_score_var, 3.5)))
+
+
+DEFAULT_ANOMALY_SETTINGS = AnomalySettings()
+
+
+def _nan_median(windows, count):
+    # Median over the last axis of the ``count`` valid values: sort (NaN last), then average the middle ones
+    ordered = np.sort(windows, axis=-1)
+    low = np.maximum((count - 1) // 2, 0)[..., None]
+    high = np.maximum(count // 2, 0)[..., None]
+    high = np.minimum(high, windows.shape[-1] - 1)
+    median = (np.take_along_axis(ordered, low, axis=-1) + np.take_along_axis(ordered, high, axis=-1))[..., 0] / 2
+    median[count == 0] = np.nan
+    return median
+
+
+def _rolling_sums(padded, window):
+    # Sum and count of the valid values of every window, from running totals along the months
+    valid = ~np.isnan(padded)
+    totals = np.zeros((padded.shape[0], padded.shape[1] + 1))
+    np.cumsum(np.where(valid, padded, 0), axis=1, out=totals[:, 1:])
+    counts = np.zeros(totals.shape, dtype=np.int32)
+    np.cumsum(valid, axis=1, out=counts[:, 1:])
+    n_months = padded.shape[1] - window
+    return totals[:, window:window + n_months] - totals[:, :n_months], counts[:, window:window + n_months] - counts[:, :n_months]
+
+
+class AnomalyScores:
+    """Scores and baselines of every cell of a rows x months matrix (float32)."""
+
+    def __init__(self, score, mean, median, mad, settings):
+        self.score = score
+        self.mean = mean
+        self.median = median
+        self.mad = mad
+        self.settings = settings
+
+    def pair_scores(self):
+        """Scores aligned with the change tables: column ``i`` scores month ``i + 1``."""
+        return self.score[:, 1:]
+
+    def anomalies(self):
+        """Boolean matrix of cells scoring above ``settings.min_score``."""
+        with np.errstate(invalid="ignore"):
+            return self.score > self.settings.min_score
+
+
+def score_anomalies(values, settings=DEFAULT_ANOMALY_SETTINGS, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Score every cell of a rows x months array against its account's history."""
+    values = np.asarray(values, dtype=np.float64)
+    n_rows, n_months = values.shape
+    window = settings.window
+    score = np.full((n_rows, n_months), np.nan, dtype=np.float32)
+    mean = np.full((n_rows, n_months), np.nan, dtype=np.float32)
+    median = np.full((n_rows, n_months), np.nan, dtype=np.float32)
+    mad = np.full((n_rows, n_months), np.nan, dtype=np.float32)
+
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        chunk = values[start:stop]
+        # Pad with NaN so month j's window is the ``window`` months before it
+        padded = np.concatenate([np.full((stop - start, window), np.nan), chunk], axis=1)
+        windows = sliding_window_view(padded, window, axis=1)[:, :n_months]
+
+        sums, count = _rolling_sums(padded, window)
+        chunk_median = _nan_median(windows, count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            chunk_mean = sums / count
+            chunk_mad = _nan_median(np.abs(windows - chunk_median[..., None]), count)
+            size = np.fmax(np.abs(chunk_median), np.abs(chunk))
+            scale = np.maximum(MAD_SCALE * chunk_mad, settings.relative_floor * size)
+            # At least one rupiah, so all-zero cells don't divide by zero
+            scale = np.maximum(scale, 1.0)
+
+            chunk_score = np.abs(chunk - chunk_median) / scale
+            if settings.season and n_months > settings.season:
+                last_year = np.full_like(chunk, np.nan)
+                last_year[:, settings.season:] = chunk[:, :-settings.season]
+                # fmin ignores a missing last-year value
+                chunk_score = np.fmin(chunk_score, np.abs(chunk - last_year) / scale)
+        chunk_score[count < settings.min_periods] = np.nan
+
+        score[start:stop] = chunk_score
+        mean[start:stop] = chunk_mean
+        median[start:stop] = chunk_median
+        mad[start:stop] = chunk_mad
+    return AnomalyScores(score, mean, median, mad, settings)
+
+
+def score_trial_balance(df, month_columns, settings=DEFAULT_ANOMALY_SETTINGS):
+    """``score_anomalies`` over the month columns of a normalized trial balance."""
+    return score_anomalies(df[month_columns].to_numpy(dtype=np.float64), settings)
+
+
+def benchmark(rows, months, settings=DEFAULT_ANOMALY_SETTINGS):
+    from changes import build_change_frames
+    from significant import find_significant_changes
+    from synthetic import synthetic_trial_balance
+
+    df, month_columns = synthetic_trial_balance(rows, months)
+    values = df[month_columns].to_numpy(dtype=np.float64)
+
+    start = time.perf_counter()
+    scores = score_anomalies(values, settings)
+    seconds = time.perf_counter() - start
+
+    changes_df, _ = build_change_frames(df, month_columns)
+    everything = np.ones(len(df), dtype=bool)
+    fixed = find_significant_changes(changes_df, everything)
+    scored = find_significant_changes(changes_df, everything, scores=scores.pair_scores(), min_score=settings.min_score)
+    return {
+        "rows": rows, "months": months, "seconds": seconds,
+        "anomalies": int(scores.anomalies().sum()),
+        "fixed_threshold": len(fixed), "with_scores": len(scored),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-baseline anomaly scores")
+    parser.add_argument("--benchmark", action="store_true", help="time the scoring of a synthetic trial balance")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--months", type=int, default=60)
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    result = benchmark(args.rows, args.months)
+    print(f"{result['rows']} akun x {result['months']} bulan: {result['seconds']:.2f} s, "
+          f"{result['anomalies']} sel anomali")
+    print(f"  perubahan signifikan (>20%):         {result['fixed_threshold']}")
+    print(f"  perubahan signifikan (>20%, anomali): {result['with_scores']}")
+
+
+if __name__ == "__main__":
+    main()
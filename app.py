@@ -1,9 +1,20 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import io
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
+from functools import partial
+
+from analysis import analyze_trial_balance
+from anomaly import AnomalySettings
+from cache import IngestCache, redis_client_from_env
+from charts import ChartRenderer
+from classifier import CategoryClassifier
+from export import XLSX_MIME, to_parquet_bytes
+from incremental import IncrementalStore, analyze_incremental
+from ingest import SUPPORTED_EXTENSIONS, TrialBalanceError, load_trial_balance, parser_options
+from jobs import DONE, QUEUED, ReportRequest, report_queue_from_env
+from profiling import Profiler, profile_stage, use_profiler
+from styling import BandThresholds, style_changes
+from table_view import PAGE_SIZES, TableView
 
 # Set page configuration
 st.set_page_config(page_title="Financial Data Analysis", layout="wide")
@@ -34,464 +45,395 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Main title
-st.markdown('<p class="main-header">Analisis Perubahan Bulanan Keuangan</p>', unsafe_allow_html=True)
+# get_analysis already keeps the parsed upload in memory, so the ingest cache only adds the Redis tier
+# that shares parsed uploads across replicas (set REDIS_URL); without Redis there is none
+@st.cache_resource
+def get_ingest_cache():
+    client = redis_client_from_env()
+    return IngestCache(redis_client=client, in_memory=False) if client is not None else None
 
-# File upload
-st.markdown('<p class="sub-header">Upload Data Excel</p>', unsafe_allow_html=True)
-uploaded_file = st.file_uploader("Pilih file Excel yang berisi data keuangan", type=["xlsx", "xls"])
+# Category lists can be overridden with a JSON file in TB_CATEGORIES_FILE
+@st.cache_resource
+def get_classifier():
+    return CategoryClassifier.from_env()
 
-if uploaded_file is not None:
-    try:
-        # Read the Excel file
-        df = pd.read_excel(uploaded_file)
-        
-        # Check if the required columns exist
-        required_columns = ["No Akun", "Keterangan"]
-        if not all(col in df.columns for col in required_columns):
-            st.error("File Excel harus memiliki kolom 'No Akun' dan 'Keterangan'")
-        else:
-            # Display the raw data
-            st.markdown('<p class="sub-header">Data Mentah</p>', unsafe_allow_html=True)
-            st.write(df)
-            
-            # Identify month columns
-            month_columns = [col for col in df.columns if col not in required_columns]
-            
-            if len(month_columns) < 2:
-                st.error("Data harus memiliki minimal 2 bulan untuk melakukan analisis perubahan")
-            else:
-                # Convert month columns to datetime and reformat
-                month_columns_formatted = []
-                for col in month_columns:
-                    try:
-                        # Parse the date
-                        date = pd.to_datetime(col, format='%Y-%m-%d %H.%M.%S')
-                        # Reformat the date to mmm-yyyy
-                        formatted_date = date.strftime('%b-%Y')
-                        month_columns_formatted.append(formatted_date)
-                    except ValueError:
-                        # If parsing fails, keep the original column name
-                        month_columns_formatted.append(col)
-                
-                # Rename the columns in the DataFrame
-                df.columns = required_columns + month_columns_formatted
-                month_columns = month_columns_formatted
-                
-                # Convert numeric columns to numeric
-                for col in month_columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                
-                # Function to calculate percentage change
-                def calculate_change(row, current_month, previous_month):
-                    if pd.isna(row[previous_month]) or pd.isna(row[current_month]):
-                        return np.nan
-                    if row[previous_month] == 0:
-                        return np.inf if row[current_month] > 0 else 0
-                    return (row[current_month] - row[previous_month]) / row[previous_month] * 100
-                
-                # Create a dataframe for monthly changes
-                changes_df = df[["No Akun", "Keterangan"]].copy()
-                
-                # Calculate month-to-month changes in percentage
-                for i in range(1, len(month_columns)):
-                    current_month = month_columns[i]
-                    previous_month = month_columns[i-1]
-                    col_name = f"Perubahan {previous_month} ke {current_month} (%)"
-                    changes_df[col_name] = df.apply(lambda row: calculate_change(row, current_month, previous_month), axis=1)
-                
-                # Calculate month-to-month changes in absolute value
-                absolute_changes_df = df[["No Akun", "Keterangan"]].copy()
-                for i in range(1, len(month_columns)):
-                    current_month = month_columns[i]
-                    previous_month = month_columns[i-1]
-                    col_name = f"Perubahan {previous_month} ke {current_month} (Rp)"
-                    absolute_changes_df[col_name] = df[current_month] - df[previous_month]
-                
-                # Function to color code changes
-                def color_significant_changes(val):
-                    if pd.isna(val):
-                        return ''
-                    if isinstance(val, (int, float)):
-                        if -5 <= val <= 5:
-                            return 'background-color: rgba(0, 255, 0, 0.2)'  # Green
-                        elif -20 <= val <= 20:
-                            return 'background-color: rgba(255, 255, 0, 0.2)'  # Yellow
-                        else:
-                            return 'background-color: rgba(255, 0, 0, 0.2)'  # Red
-                    return ''
-                
-                # Analyze specific categories
-                st.markdown('<p class="sub-header">Analisis Perubahan Bulanan</p>', unsafe_allow_html=True)
-                
-                # Filter expense categories
-                expense_categories = [
-                    "ATK", "Foto Copy", "Cetakan", 
-                    "Telephone", 
-                    "Komputer/IT", 
-                    "BBM/Transport", 
-                    "Transport Lainnya", 
-                    "Listrik & Air", 
-                    "Sewa", 
-                    "Perlengkapan Kantor",
-                    "Pengiriman", 
-                    "Konsumsi", 
-                    "Kantor Lainnya", 
-                    "Perawatan Gedung", "Perawatan Kantor",
-                    "Perawatan Kendaraan", 
-                    "Perawatan Komputer/IT", 
-                    "Penyusutan Kendaraan", 
-                    "Penyusutan komputer/IT", 
-                    "Peny Perl Elektronik", 
-                    "Penyusutan peralatan kan", 
-                    "administrasi Bank", 
-                    "Elektronik", 
-                    "Sumbangan", 
-                    "Perijinan", 
-                    "Kebersihan"
-                ]
-                
-                expense_filter = df['Keterangan'].apply(lambda x: any(category.lower() in str(x).lower() for category in expense_categories))
-                expense_df = df[expense_filter].copy()
-                
-                # Filter pinjaman rows
-                pinjaman_categories = [
-                    "Pinjaman Umum",
-                    "Pinjaman Micro Bisnis",
-                    "Pinjaman Renovasi Rumah",
-                    "Pinjaman Pendidikan Anak",
-                    "Pinjaman Sanitasi",
-                    "Pinjaman Alat Rumah Tangga"
-                ]
-                
-                pinjaman_filter = df['Keterangan'].apply(lambda x: x.strip().lower() in [category.lower() for category in pinjaman_categories])
-                pinjaman_df = df[pinjaman_filter].copy()
-                
-                # Filter simpanan rows
-                simpanan_categories = [
-                    "Simpanan Sukarela",
-                    "Simpanan Hari Raya",
-                    "Simpanan Qurban",
-                    "Simpanan Pokok",
-                    "Simpanan Wajib",
-                    "Simpanan Pendidikan & Kesehatan",
-                    "Dana Pensiun Anggota"
-                ]
-                
-                simpanan_filter = df['Keterangan'].apply(lambda x: x.strip().lower() in [category.lower() for category in simpanan_categories])
-                simpanan_df = df[simpanan_filter].copy()
-                
-                # Show expense analysis
-                if not expense_df.empty:
-                    st.markdown("### Analisis Biaya")
-                    styled_expense_changes = absolute_changes_df[absolute_changes_df['No Akun'].isin(expense_df['No Akun'])]
-                    
-                    # Apply styling based on percentage changes
-                    pct_changes = changes_df[changes_df['No Akun'].isin(expense_df['No Akun'])]
-                    pct_cols = [col for col in pct_changes.columns if "Perubahan" in col]
-                    styled_pct_changes = pct_changes.style.applymap(color_significant_changes, subset=pct_cols)
-                    
-                    # Display both tables
-                    st.write("Perubahan Persentase:")
-                    st.dataframe(styled_pct_changes)
-                    
-                    st.write("Perubahan Nominal (Rp):")
-                    st.dataframe(styled_expense_changes)
-                
-                # Show pinjaman analysis
-                if not pinjaman_df.empty:
-                    st.markdown("### Analisis Pinjaman")
-                    styled_pinjaman_changes = absolute_changes_df[absolute_changes_df['No Akun'].isin(pinjaman_df['No Akun'])]
-                    
-                    # Apply styling based on percentage changes
-                    pct_changes = changes_df[changes_df['No Akun'].isin(pinjaman_df['No Akun'])]
-                    pct_cols = [col for col in pct_changes.columns if "Perubahan" in col]
-                    styled_pct_changes = pct_changes.style.applymap(color_significant_changes, subset=pct_cols)
+# Previous analyses for incremental mode live under TB_INCREMENTAL_DIR
+@st.cache_resource
+def get_incremental_store():
+    return IncrementalStore()
 
-                    # Grouped bar chart for loan trends
-                    st.markdown('<p class="sub-header">Tren Pinjaman</p>', unsafe_allow_html=True)
-                    
-                    # Prepare data for grouped bar chart
-                    loan_data = pinjaman_df.set_index('Keterangan')[month_columns].T
-                    loan_data.columns.name = 'Keterangan'
-                    loan_data.index.name = 'Bulan, Tahun'
-                    
-                    # Plot grouped bar chart
-                    x = np.arange(len(loan_data.index))
-                    width = 0.25
-                    multiplier = 0
-                    fig, ax = plt.subplots(layout='constrained', figsize=(12, 8))
-                    
-                    for category, values in loan_data.items():
-                        offset = width * multiplier
-                        rects = ax.bar(x + offset, values / 1e8, width, label=category)  # Convert to ratusan juta
-                        ax.bar_label(rects, padding=3)
-                        multiplier += 1
-                    
-                    # Add some text for labels, title and custom x-axis tick labels, etc.
-                    ax.set_ylabel('Nominal (ratusan juta Rp)')
-                    ax.set_title('Tren Pinjaman Bulanan')
-                    ax.set_xticks(x + width, loan_data.index)
-                    ax.legend(loc='upper left', ncols=3)
-                    ax.set_ylim(0, loan_data.max().max() / 1e8 + 1)
-                    
-                    plt.xticks(rotation=45)
-                    st.pyplot(fig)
-                    
-                    # Display both tables
-                    st.write("Perubahan Persentase:")
-                    st.dataframe(styled_pct_changes)
-                    
-                    st.write("Perubahan Nominal (Rp):")
-                    st.dataframe(styled_pinjaman_changes)
-                    
-                # Show simpanan analysis
-                if not simpanan_df.empty:
-                    st.markdown("### Analisis Simpanan")
-                    styled_simpanan_changes = absolute_changes_df[absolute_changes_df['No Akun'].isin(simpanan_df['No Akun'])]
-                    
-                    # Apply styling based on percentage changes
-                    pct_changes = changes_df[changes_df['No Akun'].isin(simpanan_df['No Akun'])]
-                    pct_cols = [col for col in pct_changes.columns if "Perubahan" in col]
-                    styled_pct_changes = pct_changes.style.applymap(color_significant_changes, subset=pct_cols)
-                    
-                    # Display both tables
-                    st.write("Perubahan Persentase:")
-                    st.dataframe(styled_pct_changes)
-                    
-                    st.write("Perubahan Nominal (Rp):")
-                    st.dataframe(styled_simpanan_changes)
-                
-                # Create visualizations
-                st.markdown('<p class="sub-header">Visualisasi Data</p>', unsafe_allow_html=True)
-                
-                # Create monthly trend charts for selected categories
-                categories_to_visualize = st.multiselect(
-                    "Pilih kategori untuk divisualisasikan:", 
-                    df["Keterangan"].unique()
-                )
-                
-                if categories_to_visualize:
-                    for category in categories_to_visualize:
-                        category_data = df[df["Keterangan"] == category]
-                        if not category_data.empty:
-                            st.markdown(f"#### Tren Bulanan: {category}")
-                            category_values = category_data[month_columns].values[0]
-                            
-                            fig, ax = plt.subplots(figsize=(12, 6))
-                            ax.plot(month_columns, category_values, marker='o', linewidth=2)
-                            ax.set_title(f"Tren Bulanan: {category}")
-                            ax.set_ylabel("Nilai (Rp)")
-                            ax.set_xlabel("Bulan")
-                            ax.grid(True)
-                            plt.xticks(rotation=45)
-                            st.pyplot(fig)
-                
-                # Generate summary report
-                st.markdown('<p class="sub-header">Laporan Ringkasan</p>', unsafe_allow_html=True)
-                
-                # Find significant changes
-                def find_significant_changes(changes_df, category_filter, threshold=20):
-                    filtered_df = changes_df[category_filter].copy()
-                    change_cols = [col for col in filtered_df.columns if "Perubahan" in col]
-                    
-                    significant_changes = []
-                    for idx, row in filtered_df.iterrows():
-                        for col in change_cols:
-                            if pd.notna(row[col]) and abs(row[col]) > threshold:
-                                period = col.replace("Perubahan ", "").replace(" (%)", "")
-                                significant_changes.append({
-                                    "Kategori": row["Keterangan"],
-                                    "No Akun": row["No Akun"],
-                                    "Periode": period,
-                                    "Perubahan (%)": row[col]
-                                })
-                    
-                    return pd.DataFrame(significant_changes).sort_values("Perubahan (%)", ascending=False)
-                
-                # Generate summary of significant changes
-                expense_significant = find_significant_changes(changes_df, expense_filter)
-                pinjaman_significant = find_significant_changes(changes_df, pinjaman_filter)
-                simpanan_significant = find_significant_changes(changes_df, simpanan_filter)
-                
-                # Create summary report
-                summary_report = []
-                
-                if not expense_significant.empty:
-                    top_expense = expense_significant.iloc[0]
-                    summary_report.append(f"1. Perubahan biaya terbesar terjadi pada kategori '{top_expense['Kategori']}' pada periode {top_expense['Periode']} dengan perubahan {top_expense['Perubahan (%)']}%.")
-                
-                if not pinjaman_significant.empty:
-                    top_pinjaman = pinjaman_significant.iloc[0]
-                    summary_report.append(f"2. Pinjaman mengalami perubahan signifikan pada kategori '{top_pinjaman['Kategori']}' pada periode {top_pinjaman['Periode']} dengan perubahan {top_pinjaman['Perubahan (%)']}%.")
-                
-                if not simpanan_significant.empty:
-                    top_simpanan = simpanan_significant.iloc[0]
-                    summary_report.append(f"3. Simpanan mengalami perubahan signifikan pada kategori '{top_simpanan['Kategori']}' pada periode {top_simpanan['Periode']} dengan perubahan {top_simpanan['Perubahan (%)']}%.")
-                
-                st.markdown("#### Temuan Utama:")
-                for finding in summary_report:
-                    st.write(finding)
-                
-                # Generate customized analysis report
-                st.markdown('<p class="sub-header">Laporan Analisis Keuangan</p>', unsafe_allow_html=True)
-                
-                report_text = st.text_area(
-                    "Edit laporan analisis untuk di-download:",
-                    f"""
-Berdasarkan Trial Balance secara time series pada periode {month_columns[0]} s.d. {month_columns[-1]}, dapat dilihat beberapa anomali/ketidakwajaran dengan penjelasan singkat sebagai berikut:
+# Analysis of an upload, memoized by content hash so widget interactions never re-run the pipeline
+@st.cache_resource(max_entries=8)
+def get_analysis(data_key, file_name, incremental_mode, _data):
+    df, month_columns = load_trial_balance(_data, file_name, cache=get_ingest_cache())
+    if incremental_mode:
+        # Reuse the previous upload of the same file, matched by No Akun
+        incremental_key = os.path.splitext(file_name)[0]
+        incremental_result = analyze_incremental(df, month_columns, get_incremental_store(), incremental_key)
+    else:
+        incremental_result = None
+    return analyze_trial_balance(df, month_columns, classifier=get_classifier(), incremental_result=incremental_result,
+                                 thresholds=BandThresholds.from_env(), anomaly_settings=AnomalySettings.from_env())
 
-1. Analisis Biaya Operasional:
-   - Kategori biaya dengan perubahan terbesar adalah pada akun yang terkait dengan pengeluaran operasional.
-   - Terdapat fluktuasi signifikan pada beberapa bulan tertentu yang perlu diperhatikan.
+# Pipeline profiling for the debug panel; TB_PROFILE=1 turns it on by default (see Profiler.from_env)
+ENV_PROFILER = Profiler.from_env()
 
-2. Analisis Pinjaman:
-   - Pinjaman mengalami perubahan dinamis selama periode pengamatan.
-   - Perlu perhatian khusus pada kenaikan/penurunan yang terjadi secara ekstrem.
+def session_profiler():
+    """Activate and return this session's profiler, or None when profiling is off."""
+    profiler = None
+    if st.session_state.get("debug_profile", ENV_PROFILER is not None):
+        track_memory = st.session_state.get("debug_profile_memory", ENV_PROFILER is not None and ENV_PROFILER.track_memory)
+        profiler = st.session_state.get("profiler")
+        if profiler is None or profiler.track_memory != track_memory:
+            if profiler is not None:
+                profiler.close()
+            profiler = Profiler(
+                track_memory=track_memory,
+                log_records=ENV_PROFILER is not None and ENV_PROFILER.log_records,
+                prometheus_path=ENV_PROFILER.prometheus_path if ENV_PROFILER is not None else None,
+            )
+            st.session_state["profiler"] = profiler
+    elif "profiler" in st.session_state:
+        st.session_state.pop("profiler").close()
+    use_profiler(profiler)
+    return profiler
 
-3. Analisis Simpanan:
-   - Simpanan juga menunjukkan tren perubahan yang perlu dimonitor.
-   - Beberapa perubahan ekstrem dapat mengindikasikan pergerakan dana yang tidak biasa.
+def debug_panel(profiler):
+    with st.sidebar.expander("Profil pipeline", expanded=True):
+        summary = profiler.summary()
+        if summary:
+            st.dataframe(pd.DataFrame(summary), hide_index=True)
+        st.caption("Tahap yang diambil dari cache tidak dihitung ulang sehingga tidak tercatat")
+        st.download_button("Download JSON", profiler.to_json(), file_name="profil_pipeline.json",
+                           mime="application/json", on_click="ignore")
+        st.download_button("Download Prometheus", profiler.prometheus_text(), file_name="profil_pipeline.prom",
+                           mime="text/plain", on_click="ignore")
 
-Rekomendasi:
-- Lakukan pemeriksaan lebih lanjut terhadap perubahan ekstrem yang terjadi.
-- Buat mekanisme monitoring yang lebih ketat untuk kategori biaya yang sering mengalami fluktuasi.
-- Evaluasi kebijakan pinjaman dan simpanan untuk memastikan kestabilan keuangan.
-""",
-                    height=400
-                )
-                
-                # Export to Excel
-                st.markdown('<p class="sub-header">Download Hasil Analisis</p>', unsafe_allow_html=True)
-                
-                if st.button("Generate Excel Report"):
-                    buffer = io.BytesIO()
-                    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                        # Write original data
-                        df.to_excel(writer, sheet_name='Data Asli', index=False)
-                        
-                        # Write percentage changes
-                        changes_df.to_excel(writer, sheet_name='Perubahan (%)', index=False)
-                        
-                        # Write absolute changes
-                        absolute_changes_df.to_excel(writer, sheet_name='Perubahan (Rp)', index=False)
-                        
-                        # Write expense analysis
-                        if not expense_df.empty:
-                            expense_df.to_excel(writer, sheet_name='Analisis Biaya', index=False)
-                            changes_df[changes_df['No Akun'].isin(expense_df['No Akun'])].to_excel(
-                                writer, sheet_name='Perubahan Biaya (%)', index=False
-                            )
-                        
-                        # Write pinjaman analysis
-                        if not pinjaman_df.empty:
-                            pinjaman_df.to_excel(writer, sheet_name='Analisis Pinjaman', index=False)
-                            changes_df[changes_df['No Akun'].isin(pinjaman_df['No Akun'])].to_excel(
-                                writer, sheet_name='Perubahan Pinjaman (%)', index=False
-                            )
-                        
-                        # Write simpanan analysis
-                        if not simpanan_df.empty:
-                            simpanan_df.to_excel(writer, sheet_name='Analisis Simpanan', index=False)
-                            changes_df[changes_df['No Akun'].isin(simpanan_df['No Akun'])].to_excel(
-                                writer, sheet_name='Perubahan Simpanan (%)', index=False
-                            )
+# Paginated views are built once per upload and table; rows restricts a view to a subset of df without copying it
+@st.cache_resource(max_entries=64)
+def get_table_view(data_key, name, _df, _rows=None):
+    return TableView(_df, rows=_rows)
+
+# Server-side paginated table: only the visible page is sent to the browser
+@st.fragment
+def paginated_table(data_key, name, df, rows=None, bands=None):
+    session_profiler()
+    view = get_table_view(data_key, name, df, rows)
+    
+    filter_col, sort_col, order_col, size_col, page_col = st.columns([3, 3, 2, 1, 1])
+    filter_text = filter_col.text_input("Cari No Akun / Keterangan", key=f"{name}_filter")
+    sort_by = sort_col.selectbox("Urutkan berdasarkan", [None] + view.columns,
+                                 format_func=lambda col: "(urutan asli)" if col is None else col, key=f"{name}_sort")
+    ascending = order_col.radio("Urutan", ["Naik", "Turun"], horizontal=True, key=f"{name}_order") == "Naik"
+    page_size = size_col.selectbox("Baris", PAGE_SIZES, index=1, key=f"{name}_size")
+    
+    total_rows = len(view.ordering(sort_by, ascending, filter_text))
+    page_count = max(1, -(-total_rows // page_size))
+    page = page_col.number_input("Halaman", min_value=1, max_value=page_count, value=1, key=f"{name}_page") - 1
+    
+    with st.expander("Pilih kolom"):
+        columns = st.multiselect("Kolom", view.columns, default=view.columns, key=f"{name}_columns")
+    
+    with profile_stage("render_table", rows=total_rows, table=name):
+        if bands is not None:
+            # bands holds the precomputed color band of every "Perubahan" cell of df; slice out the visible page
+            window, _, _ = view.window(page, page_size, sort_by, ascending, filter_text)
+            page_df, _, _ = view.page(page, page_size, columns, sort_by, ascending, filter_text)
+            all_pct_cols = [col for col in view.columns if "Perubahan" in col]
+            pct_cols = [col for col in page_df.columns if "Perubahan" in col]
+            page_bands = bands()[window][:, [all_pct_cols.index(col) for col in pct_cols]]
+            st.dataframe(style_changes(page_df, page_bands, pct_cols), hide_index=True)
+        else:
+            page_table, _, _ = view.page_arrow(page, page_size, columns, sort_by, ascending, filter_text)
+            st.dataframe(page_table, hide_index=True)
+    
+    first_row = min(page * page_size + 1, total_rows)
+    last_row = min((page + 1) * page_size, total_rows)
+    st.caption(f"Baris {first_row}-{last_row} dari {total_rows} (halaman {page + 1} dari {page_count})")
+
+# Rendered charts are cached as PNG bytes per data hash, chart type and parameters
+@st.cache_resource
+def get_chart_renderer():
+    return ChartRenderer()
 
-                        # Show pinjaman analysis
-                        if not pinjaman_df.empty:
-                            st.markdown("### Analisis Pinjaman")
-                            styled_pinjaman_changes = absolute_changes_df[absolute_changes_df['No Akun'].isin(pinjaman_df['No Akun'])]
+# Only the category section the user picked is computed and rendered; switching reruns just this fragment
+@st.fragment
+def category_section(data_key, analysis):
+    session_profiler()
+    st.markdown('<p class="sub-header">Analisis Perubahan Bulanan</p>', unsafe_allow_html=True)
+    
+    sections = {"Biaya": "expense", "Pinjaman": "pinjaman", "Simpanan": "simpanan"}
+    label = st.radio("Pilih analisis:", list(sections), horizontal=True, key="category_section")
+    group = sections[label]
+    
+    # Category tables are views over the full change tables, restricted to the category's rows
+    rows = analysis.category_rows(group)
+    if not len(rows):
+        st.info(f"Tidak ada akun {label.lower()} pada data ini")
+        return
+    
+    st.markdown(f"### Analisis {label}")
+    
+    if group == 'pinjaman':
+        st.markdown('<p class="sub-header">Tren Pinjaman</p>', unsafe_allow_html=True)
+        category_df = analysis.category_df(group)
+        with profile_stage("charts", rows=len(category_df), months=len(analysis.month_columns)):
+            st.image(get_chart_renderer().render(
+                data_key, "loan_trend", {"month_columns": analysis.month_columns}, category_df
+            ))
     
-                            # Apply styling based on percentage changes
-                            pct_changes = changes_df[changes_df['No Akun'].isin(pinjaman_df['No Akun'])]
-                            pct_cols = [col for col in pct_changes.columns if "Perubahan" in col]
-                            styled_pct_changes = pct_changes.style.applymap(color_significant_changes, subset=pct_cols)
+    # Display both tables, coloring the percentage changes from the precomputed bands
+    st.write("Perubahan Persentase:")
+    paginated_table(data_key, f"{group}_pct", analysis.changes_df, rows=rows, bands=analysis.change_bands)
+    
+    st.write("Perubahan Nominal (Rp):")
+    paginated_table(data_key, f"{group}_abs", analysis.absolute_changes_df, rows=rows)
+
+# Subtotals per account group (No Akun prefix); changing the level reruns only this fragment
+@st.fragment
+def rollup_section(data_key, analysis):
+    session_profiler()
+    depth = analysis.hierarchy().depth
+    if not depth:
+        return
+    st.markdown('<p class="sub-header">Rekap per Grup Akun</p>', unsafe_allow_html=True)
+    
+    level = st.radio("Level grup No Akun:", list(range(1, depth + 1)), horizontal=True,
+                     format_func=lambda level: f"Level {level}", key="rollup_level")
+    rollup_df, changes_df, absolute_changes_df = analysis.rollup(level)
+    st.caption(f"{len(rollup_df)} grup akun pada level {level}")
+    
+    st.write("Saldo per Grup:")
+    paginated_table(data_key, f"rollup{level}", rollup_df)
+    
+    st.write("Perubahan Persentase:")
+    paginated_table(data_key, f"rollup{level}_pct", changes_df, bands=partial(analysis.rollup_bands, level))
+    
+    st.write("Perubahan Nominal (Rp):")
+    paginated_table(data_key, f"rollup{level}_abs", absolute_changes_df)
 
-                            # Komposisi Pinjaman
-                            st.markdown('<p class="sub-header">Komposisi Pinjaman</p>', unsafe_allow_html=True)
+# Trend charts; picking categories reruns only this fragment
+@st.fragment
+def visualization_section(data_key, analysis):
+    session_profiler()
+    df, month_columns = analysis.df, analysis.month_columns
+    st.markdown('<p class="sub-header">Visualisasi Data</p>', unsafe_allow_html=True)
     
-                            # Filter pinjaman untuk bulan dan tahun terakhir
-                            last_month = month_columns[-1]
-                            pinjaman_last_month = pinjaman_df[last_month].dropna()
+    # Create monthly trend charts for selected categories
+    categories_to_visualize = st.multiselect(
+        "Pilih kategori untuk divisualisasikan:", 
+        df["Keterangan"].unique(),
+        key="visualize_categories"
+    )
     
-                            # Hitung total nominal dan persentase komposisi
-                            total_pinjaman = pinjaman_last_month.sum()
-                            pinjaman_composition = pinjaman_last_month.groupby(pinjaman_df['Keterangan']).sum().reset_index()
-                            pinjaman_composition['Persentase (%)'] = (pinjaman_composition[last_month] / total_pinjaman) * 100
+    # Render the selected charts in parallel; cached ones are served as-is
+    charts = []
+    for category in categories_to_visualize:
+        category_data = df[df["Keterangan"] == category]
+        if not category_data.empty:
+            category_values = category_data[month_columns].values[0]
+            charts.append((category, (data_key, "account_trend", {"category": category, "month_columns": month_columns}, category_values)))
     
-                            # Tampilkan tabel komposisi pinjaman
-                            st.markdown("#### Komposisi Pinjaman Bulan Terakhir")
-                            st.dataframe(pinjaman_composition)
-                            
-                            # Buat pie chart
-                            fig, ax = plt.subplots(figsize=(8, 8))
+    with profile_stage("charts", rows=len(charts), months=len(month_columns)):
+        images = get_chart_renderer().render_many([request for _, request in charts])
+    for (category, _), image in zip(charts, images):
+        st.markdown(f"#### Tren Bulanan: {category}")
+        st.image(image)
 
-                            # Tampilkan semua label di luar pie chart
-                            labels = pinjaman_composition['Persentase (%)'].apply(lambda x: f"{x:.1f}%")
+# Excel reports are exported by a queue shared by all sessions; see jobs.py for TB_REPORT_QUEUE / TB_REPORT_WORKERS
+@st.cache_resource
+def get_report_queue():
+    return report_queue_from_env()
 
-                            wedges, texts, autotexts = ax.pie(
-                                pinjaman_composition[last_month], 
-                                labels=labels, 
-                                autopct='%1.1f%%', 
-                                startangle=90, 
-                                colors=sns.color_palette("Set3", len(pinjaman_composition)),
-                                labeldistance=1.1
-                                )
-                            
+# Status of a background export, polled every second until it finishes
+@st.fragment(run_every=1)
+def report_progress(job_key):
+    job = get_report_queue().get(job_key)
+    if job is None or not job.pending:
+        # Rerun the page so the report section shows the download or the error
+        st.rerun()
+    if job.status == QUEUED:
+        st.progress(0.0, text="Laporan Excel menunggu antrean...")
+    else:
+        st.progress(job.progress, text=f"Membuat laporan Excel: sheet '{job.message}' ({job.progress:.0%})")
+
+# Report editing and downloads; typing in the text area reruns only this fragment
+@st.fragment
+def report_section(data_key, analysis, data, file_name):
+    profiler = session_profiler()
+    month_columns = analysis.month_columns
+    
+    # Generate customized analysis report
+    st.markdown('<p class="sub-header">Laporan Analisis Keuangan</p>', unsafe_allow_html=True)
     
-                        # Tambahkan legenda
-                            ax.legend(wedges, pinjaman_composition['Keterangan'], title="Keterangan", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1))
-                            ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+    report_text = st.text_area(
+        "Edit laporan analisis untuk di-download:",
+        analysis.default_report_text(),
+        height=400
+    )
+    
+    # Export to Excel
+    st.markdown('<p class="sub-header">Download Hasil Analisis</p>', unsafe_allow_html=True)
+    
+    job_state_key = f"report_job:{data_key}"
+    if st.button("Generate Excel Report"):
+        # Exported in the background; clicking again with the same inputs returns the same job
+        request = ReportRequest(data_key, data, file_name, report_text, analysis, profile=profiler is not None)
+        st.session_state[job_state_key] = get_report_queue().submit(request).key
+    
+    job_key = st.session_state.get(job_state_key)
+    job = get_report_queue().get(job_key) if job_key else None
+    if job is not None:
+        if job.pending:
+            report_progress(job_key)
+        elif job.status == DONE:
+            # Serve the download straight from the finished report
+            with get_report_queue().open_report(job) as report_file:
+                st.download_button(
+                    label="Download Excel Report",
+                    data=report_file,
+                    file_name="Analisis_Keuangan.xlsx",
+                    mime=XLSX_MIME,
+                    on_click="ignore"
+                )
+            if profiler is not None and job.profile:
+                # Recorded by the export's own profiler, not the session's
+                with st.expander("Profil pembuatan laporan Excel"):
+                    st.dataframe(pd.DataFrame(job.profile), hide_index=True)
+        else:
+            st.error(f"Gagal membuat laporan Excel: {job.error}")
+        
+        # Show pinjaman composition
+        pinjaman_df = analysis.category_df('pinjaman')
+        if not pinjaman_df.empty:
+            st.markdown("### Analisis Pinjaman")
+            
+            # Komposisi Pinjaman
+            st.markdown('<p class="sub-header">Komposisi Pinjaman</p>', unsafe_allow_html=True)
+            
+            # Filter pinjaman untuk bulan dan tahun terakhir
+            last_month = month_columns[-1]
+            pinjaman_last_month = pinjaman_df[last_month].dropna()
+            
+            # Hitung total nominal dan persentase komposisi
+            total_pinjaman = pinjaman_last_month.sum()
+            pinjaman_composition = pinjaman_last_month.groupby(pinjaman_df['Keterangan'], observed=True).sum().reset_index()
+            pinjaman_composition['Persentase (%)'] = (pinjaman_composition[last_month] / total_pinjaman) * 100
+            
+            # Tampilkan tabel komposisi pinjaman
+            st.markdown("#### Komposisi Pinjaman Bulan Terakhir")
+            st.dataframe(pinjaman_composition)
+            
+            # Buat pie chart
+            with profile_stage("charts", rows=len(pinjaman_composition)):
+                st.image(get_chart_renderer().render(
+                    data_key, "loan_composition", {"last_month": last_month}, pinjaman_composition
+                ))
+    
+    # Export the change tables as Parquet for downstream jobs
+    if st.button("Generate Parquet Export"):
+        with profile_stage("parquet_export", rows=len(analysis.changes_df), months=len(month_columns)):
+            changes_parquet = to_parquet_bytes(analysis.changes_df)
+            absolute_changes_parquet = to_parquet_bytes(analysis.absolute_changes_df)
+        st.download_button(
+            label="Download Perubahan (%) (Parquet)",
+            data=changes_parquet,
+            file_name="Perubahan_Persen.parquet",
+            mime="application/vnd.apache.parquet",
+            on_click="ignore"
+        )
+        st.download_button(
+            label="Download Perubahan (Rp) (Parquet)",
+            data=absolute_changes_parquet,
+            file_name="Perubahan_Rp.parquet",
+            mime="application/vnd.apache.parquet",
+            on_click="ignore"
+        )
+
+# Debug panel: per-stage timings and memory of this session's runs
+st.sidebar.checkbox("Debug: profil pipeline", value=ENV_PROFILER is not None, key="debug_profile")
+if st.session_state["debug_profile"]:
+    st.sidebar.checkbox("Lacak memori (tracemalloc, lebih lambat)",
+                        value=ENV_PROFILER is not None and ENV_PROFILER.track_memory, key="debug_profile_memory")
+profiler = session_profiler()
+if profiler is not None:
+    profiler.reset()
 
-                            st.pyplot(fig)
+# Main title
+st.markdown('<p class="main-header">Analisis Perubahan Bulanan Keuangan</p>', unsafe_allow_html=True)
+
+# File upload
+st.markdown('<p class="sub-header">Upload Data</p>', unsafe_allow_html=True)
+uploaded_file = st.file_uploader(
+    "Pilih file Excel, Parquet, Feather/Arrow atau CSV yang berisi data keuangan",
+    type=list(SUPPORTED_EXTENSIONS)
+)
+incremental_mode = st.checkbox(
+    "Analisis inkremental (hanya hitung ulang bulan yang baru atau berubah sejak upload sebelumnya)"
+)
 
-                        # Write significant changes
-                        pd.concat([
-                            expense_significant, 
-                            pinjaman_significant,
-                            simpanan_significant
-                        ]).to_excel(writer, sheet_name='Perubahan Signifikan', index=False)
-                        
-                        # Write summary report
-                        workbook = writer.book
-                        summary_sheet = workbook.add_worksheet('Ringkasan Analisis')
-                        
-                        # Format the summary sheet
-                        bold_format = workbook.add_format({'bold': False, 'font_size': 11})
-                        normal_format = workbook.add_format({'font_size': 11})
-                        
-                        # Write the report
-                        summary_sheet.write(0, 0, "LAPORAN ANALISIS KEUANGAN", bold_format)
-                        summary_sheet.write(2, 0, "Periode Analisis:", bold_format)
-                        summary_sheet.write(2, 1, f"{month_columns[0]} s.d. {month_columns[-1]}", normal_format)
-                        
-                        row = 4
-                        for line in report_text.split('\n'):
-                            summary_sheet.write(row, 0, line, normal_format)
-                            row += 1
-                    
-                    buffer.seek(0)
-                    st.download_button(
-                        label="Download Excel Report",
-                        data=buffer,
-                        file_name="Analisis_Keuangan.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
-                
+if uploaded_file is not None:
+    try:
+        # Read, normalize and analyze the file (memoized by content hash across reruns)
+        data = uploaded_file.getvalue()
+        data_key = IngestCache.make_key(data, dict(parser_options(uploaded_file.name), incremental=incremental_mode))
+        try:
+            analysis = get_analysis(data_key, uploaded_file.name, incremental_mode, data)
+        except TrialBalanceError as e:
+            st.error(str(e))
+        else:
+            # Display the raw data
+            st.markdown('<p class="sub-header">Data Mentah</p>', unsafe_allow_html=True)
+            paginated_table(data_key, "raw", analysis.df)
+            
+            if analysis.incremental_result is not None:
+                st.caption(
+                    f"Analisis inkremental: {len(analysis.incremental_result.recomputed_pairs)} pasangan bulan dihitung ulang, "
+                    f"{len(analysis.incremental_result.reused_pairs)} digunakan kembali"
+                )
+            
+            # Analyze specific categories
+            category_section(data_key, analysis)
+            
+            # Subtotals per account group
+            rollup_section(data_key, analysis)
+            
+            # Create visualizations
+            visualization_section(data_key, analysis)
+            
+            # Generate summary report
+            st.markdown('<p class="sub-header">Laporan Ringkasan</p>', unsafe_allow_html=True)
+            
+            # Create summary report from the largest significant change per category
+            summary_report = analysis.summary_findings()
+            
+            st.markdown("#### Temuan Utama:")
+            for finding in summary_report:
+                st.write(finding)
+            
+            # Report text and downloads
+            report_section(data_key, analysis, data, uploaded_file.name)
+            
     except Exception as e:
         st.error(f"Error reading file: {e}")
 else:
-    st.info("Silakan upload file Excel untuk memulai analisis")
+    st.info("Silakan upload file data keuangan untuk memulai analisis")
 
-# Add footer with instructions
+if profiler is not None:
+    debug_panel(profiler)
+    profiler.write_prometheus()
+
+# Add footer with instructions; the color legend follows the configured bands (TB_BAND_GREEN, TB_BAND_YELLOW)
+band_thresholds = BandThresholds.from_env()
+green, yellow = f"{band_thresholds.green:g}", f"{band_thresholds.yellow:g}"
 st.markdown("---")
-st.markdown("""
+st.markdown(f"""
 ### Panduan Penggunaan:
-1. Upload file Excel dengan format sesuai (kolom No Akun, Keterangan, dan kolom bulan-bulan)
+1. Upload file Excel, Parquet, Feather/Arrow atau CSV dengan format sesuai (kolom No Akun, Keterangan, dan kolom bulan-bulan)
 2. Aplikasi akan menganalisis perubahan bulanan untuk kategori biaya, pinjaman, dan simpanan
 3. Hasil analisis dapat didownload dalam format Excel
 4. Warna pada tabel persentase perubahan:
-   - Hijau: Perubahan ringan (-5% sampai 5%)
-   - Kuning: Perubahan moderat (-20% sampai 20%)
-   - Merah: Perubahan signifikan (di bawah -20% atau di atas 20%)
+   - Hijau: Perubahan ringan (-{green}% sampai {green}%)
+   - Kuning: Perubahan moderat (-{yellow}% sampai {yellow}%)
+   - Merah: Perubahan signifikan (di bawah -{yellow}% atau di atas {yellow}%)
 """)
@@ -0,0 +1,227 @@
+"""Headless batch analysis of many branch trial balances.
+
+Usage::
+
+    python batch.py DATA_DIR --output OUT_DIR [--workers 8] [--chunksize 4] [--metrics tb.prom]
+
+Every supported file in ``DATA_DIR`` (Excel, Parquet, Feather/Arrow, CSV) is
+parsed and analyzed in a process pool. One Excel report is written per
+branch (named after the file) together with a consolidated significant-change
+table (``Perubahan_Signifikan_Konsolidasi.xlsx`` and ``.parquet``). A failing
+file is reported and skipped; the rest of the batch keeps going, also when a
+file crashes its worker process (the pool is then recreated). With
+``--metrics`` the per-stage timings of every branch are written as a
+Prometheus text file (see ``profiling``).
+"""
+import argparse
+import os
+import sys
+import time
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from analysis import analyze_trial_balance
+from classifier import CategoryClassifier
+from export import ExcelReportWriter, write_parquet
+from ingest import SUPPORTED_EXTENSIONS, normalize_trial_balance, read_trial_balance_file
+from profiling import Profiler, profile_stage, prometheus_text, use_profiler
+
+CONSOLIDATED_NAME = "Perubahan_Signifikan_Konsolidasi"
+
+
+def find_input_files(data_dir):
+    paths = []
+    for name in sorted(os.listdir(data_dir)):
+        extension = os.path.splitext(name)[1].lstrip(".").lower()
+        # Skip Excel lock files such as "~$Cabang.xlsx"
+        if extension in SUPPORTED_EXTENSIONS and not name.startswith("~$"):
+            paths.append(os.path.join(data_dir, name))
+    return paths
+
+
+def _new_result(path):
+    return {"branch": os.path.splitext(os.path.basename(path))[0], "path": path, "ok": False, "significant": None}
+
+
+def analyze_file(path, output_dir, categories=None, profile=False):
+    """Analyze one branch file; never raises, failures are returned in the result."""
+    result = _new_result(path)
+    branch = result["branch"]
+    profiler = Profiler() if profile else None
+    use_profiler(profiler)
+    start = time.perf_counter()
+    try:
+        with profile_stage("read") as stage:
+            raw = read_trial_balance_file(path)
+            stage.set(rows=len(raw))
+        df, month_columns = normalize_trial_balance(raw)
+        result["rows"], result["months"] = len(df), len(month_columns)
+        result["read_seconds"] = time.perf_counter() - start
+
+        analysis = analyze_trial_balance(df, month_columns, classifier=CategoryClassifier(categories))
+        significant = analysis.all_significant_changes()
+        result["analyze_seconds"] = time.perf_counter() - start - result["read_seconds"]
+
+        report_path = os.path.join(output_dir, f"Analisis_{branch}.xlsx")
+        analysis.write_excel_report(report_path)
+        result["report"] = report_path
+
+        significant.insert(0, "Cabang", branch)
+        result["significant"] = significant
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+    result["seconds"] = time.perf_counter() - start
+    if profiler is not None:
+        result["profile"] = profiler.summary()
+    return result
+
+
+def _analyze_file_star(args):
+    return analyze_file(*args)
+
+
+def _analyze_chunk(tasks):
+    return [analyze_file(*task) for task in tasks]
+
+
+def _crashed_result(task, error):
+    # The worker process died (e.g. killed for running out of memory) instead of returning a result
+    result = _new_result(task[0])
+    result["error"] = f"{type(error).__name__}: {error}"
+    result["traceback"] = "".join(traceback.format_exception(error))
+    return result
+
+
+def _run_isolated(task):
+    # Alone in a fresh process, so a crash can only be this file's
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        try:
+            return executor.submit(_analyze_file_star, task).result()
+        except BrokenProcessPool as e:
+            return _crashed_result(task, e)
+
+
+def _map_tasks(tasks, workers, chunksize):
+    if workers == 1:
+        # Run inline, handy for debugging and profiling
+        yield from map(_analyze_file_star, tasks)
+        return
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, chunksize)
+    pending = deque(tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize))
+    while pending:
+        # Only as many chunks in flight as workers: when a worker dies and breaks the pool, those are
+        # the only files that may have caused it, and the ones not submitted yet are unaffected
+        suspects = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            running = {}
+            while running or pending and not suspects:
+                while pending and not suspects and len(running) < workers:
+                    chunk = pending.popleft()
+                    running[executor.submit(_analyze_chunk, chunk)] = chunk
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = running.pop(future)
+                    try:
+                        yield from future.result()
+                    except BrokenProcessPool:
+                        suspects.append(chunk)
+        # Rerun the suspects one by one: the file that crashes gets a failed result, the others succeed.
+        # The rest of the batch goes on in a new pool
+        for chunk in suspects:
+            for task in chunk:
+                yield _run_isolated(task)
+
+
+def run_batch(data_dir, output_dir, workers=None, chunksize=1, categories=None, progress=None, profile=False):
+    """Analyze every file in ``data_dir`` and return the per-file results."""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = find_input_files(data_dir)
+    tasks = [(path, output_dir, categories, profile) for path in paths]
+
+    results = []
+    for result in _map_tasks(tasks, workers, chunksize):
+        results.append(result)
+        if progress:
+            progress(result, len(results), len(tasks))
+    # Reported as they finish, returned in file order
+    order = {path: i for i, path in enumerate(paths)}
+    results.sort(key=lambda result: order[result["path"]])
+    return results
+
+
+def write_consolidated(results, output_dir):
+    """Write the significant changes of all successful branches to one table."""
+    frames = [result["significant"] for result in results if result["ok"]]
+    if frames:
+        consolidated = pd.concat(frames, ignore_index=True).sort_values("Perubahan (%)", ascending=False)
+    else:
+        consolidated = pd.DataFrame(columns=["Cabang", "Kategori", "No Akun", "Periode", "Perubahan (%)", "Skor Anomali"])
+
+    xlsx_path = os.path.join(output_dir, f"{CONSOLIDATED_NAME}.xlsx")
+    with ExcelReportWriter(xlsx_path) as writer:
+        writer.write_frame("Perubahan Signifikan", consolidated)
+    write_parquet(consolidated, os.path.join(output_dir, f"{CONSOLIDATED_NAME}.parquet"))
+    return consolidated
+
+
+def write_metrics(results, path):
+    """Write the per-branch stage profiles as a Prometheus text file."""
+    summaries = [({"branch": result["branch"]}, result["profile"]) for result in results if result.get("profile")]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(summaries))
+    os.replace(tmp_path, path)
+
+
+def _print_progress(result, done, total):
+    if result["ok"]:
+        print(f"[{done}/{total}] {result['branch']}: {result['rows']} akun x {result['months']} bulan "
+              f"in {result['seconds']:.2f} s (baca {result['read_seconds']:.2f} s, "
+              f"analisis {result['analyze_seconds']:.2f} s)", flush=True)
+    else:
+        print(f"[{done}/{total}] {result['branch']}: GAGAL - {result['error']}", file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analisis trial balance banyak cabang sekaligus")
+    parser.add_argument("data_dir", help="directory containing one trial balance file per branch")
+    parser.add_argument("--output", "-o", default="hasil_analisis", help="directory for the reports")
+    parser.add_argument("--workers", "-w", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=1, help="files handed to a worker at a time")
+    parser.add_argument("--categories", help="JSON file with category lists (see classifier.DEFAULT_CATEGORIES)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="print tracebacks of failed files")
+    parser.add_argument("--metrics", help="write per-stage timings of every branch to this Prometheus text file")
+    args = parser.parse_args(argv)
+
+    categories = CategoryClassifier.from_json(args.categories).categories if args.categories else None
+
+    start = time.perf_counter()
+    results = run_batch(args.data_dir, args.output, workers=args.workers, chunksize=args.chunksize,
+                        categories=categories, progress=_print_progress, profile=bool(args.metrics))
+    consolidated = write_consolidated(results, args.output)
+    if args.metrics:
+        write_metrics(results, args.metrics)
+    elapsed = time.perf_counter() - start
+
+    failed = [result for result in results if not result["ok"]]
+    succeeded = len(results) - len(failed)
+    total_rows = sum(result.get("rows", 0) for result in results if result["ok"])
+    print(f"\n{succeeded}/{len(results)} file berhasil dianalisis dalam {elapsed:.2f} s "
+          f"({len(results) / elapsed if elapsed else 0:.2f} file/s, {total_rows / elapsed if elapsed else 0:,.0f} akun/s)")
+    print(f"{len(consolidated)} perubahan signifikan ditulis ke {os.path.join(args.output, CONSOLIDATED_NAME)}.xlsx")
+    for result in failed:
+        print(f"GAGAL {result['path']}: {result['error']}", file=sys.stderr)
+        if args.verbose:
+            print(result["traceback"], file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""End-to-end benchmark of the analysis pipeline, with regression checks.
+
+Runs every stage of what app.py does for an upload, headlessly and outside
+Streamlit, on synthetic workbooks (see ``synthetic.py``) of several sizes:
+
+    read, parse_headers, to_numeric    ingest.load_trial_balance
+    changes, classify                  analysis.analyze_trial_balance
+    category_filter                    category rows and the first table page
+    anomaly, significant               significant changes and "Temuan Utama"
+    rollup                             account group subtotals
+    styling                            color bands and the styled first page
+    charts                             pinjaman trend (per product) and composition charts
+    excel_export                       the full Excel report
+
+Each run is a fresh process recording its stages with ``profiling.Profiler``.
+Times are the best of ``--repeat`` runs. Peak memory per stage comes from
+one extra run with tracemalloc on, so tracing does not distort the times.
+
+The results are compared against a stored baseline (``--baseline``, by
+default benchmark_baseline.json next to this file). A stage regresses when it
+is more than ``--max-slowdown`` slower (and at least ``--min-seconds``), or its
+peak memory grows by more than ``--max-memory-growth`` (and at least 1 MB).
+Regressions make the command exit with status 1. Baselines are machine
+specific: refresh them with ``--save-baseline`` on the machine that runs the
+checks.
+
+Usage::
+
+    python benchmark.py --sizes 2000x24,20000x60 --repeat 3
+    python benchmark.py --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+
+DEFAULT_SIZES = "2000x24,20000x60"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+PAGE_SIZE = 100
+
+
+def run_pipeline(path, report_path):
+    """Run every pipeline stage on the workbook at ``path`` under the active profiler."""
+    from analysis import analyze_trial_balance
+    from charts import ChartRenderer
+    from ingest import load_trial_balance
+    from profiling import profile_stage
+    from styling import style_changes
+    from table_view import TableView
+
+    with open(path, "rb") as f:
+        data = f.read()
+    df, month_columns = load_trial_balance(data, os.path.basename(path))
+    analysis = analyze_trial_balance(df, month_columns)
+
+    with profile_stage("category_filter", rows=len(df), months=len(month_columns)):
+        views = {}
+        for group in analysis.category_filters:
+            views[group] = TableView(analysis.changes_df, rows=analysis.category_rows(group))
+            views[group].page(0, PAGE_SIZE)
+
+    analysis.all_significant_changes()
+    analysis.summary_findings()
+    analysis.rollup(1)
+
+    with profile_stage("styling", rows=len(df), months=len(month_columns)):
+        bands = analysis.change_bands()
+        for view in views.values():
+            window, _, _ = view.window(0, PAGE_SIZE)
+            page_df, _, _ = view.page(0, PAGE_SIZE)
+            pct_cols = [col for col in page_df.columns if "Perubahan" in col]
+            style_changes(page_df, bands[window], pct_cols).to_html()
+
+    with profile_stage("charts", rows=len(df), months=len(month_columns)):
+        renderer = ChartRenderer()
+        pinjaman_df = analysis.category_df("pinjaman")
+        if not pinjaman_df.empty:
+            last_month = month_columns[-1]
+            # The app draws a bar per pinjaman account: a real trial balance has a handful, one per
+            # product, while synthetic ones have hundreds, so sum them per product first
+            products = pinjaman_df.groupby("Keterangan", observed=True, sort=False)[month_columns].sum().reset_index()
+            renderer.render("benchmark", "loan_trend", {"month_columns": month_columns}, products)
+            last_values = pinjaman_df[last_month].dropna()
+            composition = last_values.groupby(pinjaman_df["Keterangan"], observed=True).sum().reset_index()
+            composition["Persentase (%)"] = composition[last_month] / last_values.sum() * 100
+            renderer.render("benchmark", "loan_composition", {"last_month": last_month}, composition)
+
+    analysis.write_excel_report(report_path)
+
+
+def _benchmark_child(path, track_memory):
+    # The pipeline imports "profiling", not "__main__"
+    from profiling import Profiler, use_profiler
+
+    profiler = Profiler(track_memory=track_memory == "1")
+    use_profiler(profiler)
+    fd, report_path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        run_pipeline(path, report_path)
+    finally:
+        os.remove(report_path)
+        profiler.close()
+    print(json.dumps(profiler.summary()))
+
+
+def _run_child(path, track_memory):
+    from profiling import run_benchmark_child
+
+    return {entry["stage"]: entry for entry in run_benchmark_child(__file__, path, "1" if track_memory else "0")}
+
+
+def benchmark_size(rows, months, repeat=1, memory=True, seed=0):
+    """Per-stage results of one size: best wall/CPU time of ``repeat`` runs, peak memory of a traced run."""
+    from synthetic import synthetic_raw_trial_balance, write_synthetic_workbook
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        write_synthetic_workbook(path, synthetic_raw_trial_balance(rows, months, seed=seed), text_rate=0.01, seed=seed)
+        stages = {}
+        for _ in range(repeat):
+            for name, entry in _run_child(path, track_memory=False).items():
+                best = stages.setdefault(name, {"calls": entry["calls"]})
+                if "max_rss_bytes" in entry:
+                    best["max_rss_bytes"] = entry["max_rss_bytes"]
+                for field in ("wall_seconds", "cpu_seconds"):
+                    best[field] = min(best.get(field, entry[field]), entry[field])
+        if memory:
+            for name, entry in _run_child(path, track_memory=True).items():
+                if "peak_bytes" in entry and name in stages:
+                    stages[name]["peak_bytes"] = entry["peak_bytes"]
+    finally:
+        os.remove(path)
+    return stages
+
+
+def run_benchmarks(sizes, repeat=1, memory=True):
+    return {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "sizes": {f"{rows}x{months}": benchmark_size(rows, months, repeat, memory) for rows, months in sizes},
+    }
+
+
+def compare(results, baseline, max_slowdown=0.25, max_memory_growth=0.2, min_seconds=0.05, min_bytes=1024 * 1024):
+    """Rows of ``(size, stage, seconds, baseline_seconds, peak_mb, baseline_peak_mb, problems)``."""
+    rows = []
+    for size, stages in results["sizes"].items():
+        base_stages = baseline.get("sizes", {}).get(size, {})
+        for stage, entry in stages.items():
+            base = base_stages.get(stage)
+            problems = []
+            if base is not None:
+                seconds, base_seconds = entry["wall_seconds"], base["wall_seconds"]
+                if seconds > base_seconds * (1 + max_slowdown) and seconds - base_seconds >= min_seconds:
+                    problems.append(f"{seconds / base_seconds - 1:+.0%} time")
+                if "peak_bytes" in entry and "peak_bytes" in base:
+                    peak, base_peak = entry["peak_bytes"], base["peak_bytes"]
+                    if peak > base_peak * (1 + max_memory_growth) and peak - base_peak >= min_bytes:
+                        problems.append(f"{peak / max(base_peak, 1) - 1:+.0%} memory")
+            rows.append((size, stage, entry["wall_seconds"], base and base["wall_seconds"],
+                         entry.get("peak_bytes"), base and base.get("peak_bytes"), problems))
+    return rows
+
+
+def _seconds(value):
+    return "-" if value is None else f"{value:.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark with regression checks")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated ROWSxMONTHS list")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size; the best time counts")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run measuring peak memory")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    parser.add_argument("--max-slowdown", type=float, default=0.25, help="allowed relative slowdown per stage")
+    parser.add_argument("--max-memory-growth", type=float, default=0.2, help="allowed relative peak memory growth")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="ignore slowdowns smaller than this")
+    parser.add_argument("--benchmark-child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.benchmark_child:
+        _benchmark_child(*args.benchmark_child)
+        return 0
+
+    sizes = [tuple(int(part) for part in size.lower().split("x")) for size in args.sizes.split(",")]
+    results = run_benchmarks(sizes, repeat=args.repeat, memory=not args.no_memory)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    from profiling import format_mb, megabytes
+
+    rows = compare(results, baseline, args.max_slowdown, args.max_memory_growth, args.min_seconds)
+    print(f"{'size':>10} {'stage':<16} {'seconds':>9} {'baseline':>9} {'peak MB':>8} {'baseline':>8}  status")
+    for size, stage, seconds, base_seconds, peak, base_peak, problems in rows:
+        status = "REGRESSION " + ", ".join(problems) if problems else ("ok" if base_seconds is not None else "new")
+        print(f"{size:>10} {stage:<16} {_seconds(seconds):>9} {_seconds(base_seconds):>9} "
+              f"{format_mb(megabytes(peak)):>8} {format_mb(megabytes(base_peak)):>8}  {status}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    return 1 if any(problems for *_, problems in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Two-tier cache for parsed trial balances.
+
+Entries are keyed by a hash of the uploaded bytes plus the parser options.
+The in-process tier is an LRU bounded by entry count and approximate size in
+bytes; callers that keep the results in memory themselves turn it off with
+``in_memory=False`` rather than hold a second copy. The optional Redis tier lets several app replicas share parsed
+results; any client exposing ``get``/``set`` (``redis.Redis`` or a fake) can
+be passed in. Redis values are pickled, so only point this at a Redis
+instance the app trusts.
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+KEY_PREFIX = "tb:ingest:"
+
+
+def _sizeof(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(item) for item in value)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return 64
+
+
+def _copy(value):
+    # Callers get their own frames so they cannot corrupt the cached copy
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(_copy(item) for item in value)
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+class LRUCache:
+    """Thread-safe in-process LRU bounded by entry count and total size."""
+
+    def __init__(self, max_entries=16, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def current_bytes(self):
+        return self._bytes
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        size = _sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                # Too big to ever fit; don't flush everything else for it
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class IngestCache:
+    """Cache for ``(df, month_columns)`` results of ``ingest.load_trial_balance``."""
+
+    def __init__(self, memory=None, redis_client=None, ttl_seconds=24 * 3600, max_redis_bytes=256 * 1024 * 1024,
+                 in_memory=True):
+        self.memory = (memory if memory is not None else LRUCache()) if in_memory else None
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.max_redis_bytes = max_redis_bytes
+
+    @staticmethod
+    def make_key(data, options=None):
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps(options or {}, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        value = self.memory.get(key) if self.memory is not None else None
+        if value is not None:
+            return _copy(value)
+
+        if self.redis is not None:
+            try:
+                payload = self.redis.get(KEY_PREFIX + key)
+            except Exception:
+                # A flaky shared tier must never break the upload
+                payload = None
+            if payload is not None:
+                value = pickle.loads(payload)
+                if self.memory is None:
+                    return value
+                self.memory.put(key, value)
+                return _copy(value)
+        return None
+
+    def put(self, key, value):
+        if self.memory is not None:
+            self.memory.put(key, _copy(value))
+
+        if self.redis is not None:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(payload) > self.max_redis_bytes:
+                return
+            try:
+                self.redis.set(KEY_PREFIX + key, payload, ex=self.ttl_seconds)
+            except Exception:
+                pass
+
+
+def redis_client_from_env(env_var="REDIS_URL"):
+    """Return a Redis client for ``$REDIS_URL``, or None when it is not set."""
+    url = os.environ.get(env_var)
+    if not url:
+        return None
+    import redis
+
+    return redis.Redis.from_url(url)
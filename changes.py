@@ -0,0 +1,162 @@
+"""Month-over-month change engine for trial balances.
+
+All percentage and absolute (Rp) changes for every adjacent month pair are
+computed in one NumPy pass over the 2-D month matrix. The semantics match the
+original row-wise ``calculate_change``:
+
+- NaN in either month gives NaN
+- a zero base gives ``inf`` when the current month is positive, else 0
+- otherwise ``(current - previous) / previous * 100``
+
+Run ``python changes.py --benchmark`` to compare against the apply-based
+implementation on a synthetic trial balance.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from compact import compact_changes
+
+KEY_COLUMNS = ["No Akun", "Keterangan"]
+
+
+def pct_column_name(previous_month, current_month):
+    return f"Perubahan {previous_month} ke {current_month} (%)"
+
+
+def abs_column_name(previous_month, current_month):
+    return f"Perubahan {previous_month} ke {current_month} (Rp)"
+
+
+# Original row-wise implementation, kept as the reference for the benchmark
+def calculate_change(row, current_month, previous_month):
+    if pd.isna(row[previous_month]) or pd.isna(row[current_month]):
+        return np.nan
+    if row[previous_month] == 0:
+        return np.inf if row[current_month] > 0 else 0
+    return (row[current_month] - row[previous_month]) / row[previous_month] * 100
+
+
+def calculate_changes(values):
+    """Return ``(pct, absolute)`` change matrices for a rows x months array.
+
+    Both results have one column fewer than ``values``; column ``i`` holds the
+    change from month ``i`` to month ``i + 1``.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    previous = values[:, :-1]
+    current = values[:, 1:]
+
+    absolute = current - previous
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Same operation order as absolute / previous * 100, without the temporary
+        pct = np.divide(absolute, previous)
+        pct *= 100
+
+    zero_base = previous == 0
+    pct[zero_base] = np.where(current[zero_base] > 0, np.inf, 0.0)
+    pct[np.isnan(previous) | np.isnan(current)] = np.nan
+    return pct, absolute
+
+
+def build_change_frames(df, month_columns, chunk_months=12):
+    """Return ``(changes_df, absolute_changes_df)`` in the layout used by the app."""
+    n_pairs = len(month_columns) - 1
+    pct = np.empty((len(df), n_pairs))
+    absolute = np.empty((len(df), n_pairs))
+    # A few months at a time, so a float64 copy of the whole (possibly compact) month matrix is never needed
+    for start in range(0, n_pairs, chunk_months):
+        stop = min(start + chunk_months, n_pairs)
+        values = df[month_columns[start:stop + 1]].to_numpy(dtype=np.float64)
+        pct[:, start:stop], absolute[:, start:stop] = calculate_changes(values)
+    return change_frames_from_arrays(df, month_columns, pct, absolute)
+
+
+def change_frames_from_arrays(df, month_columns, pct, absolute):
+    # Wrap precomputed change matrices in the app's table layout; the matrices
+    # become the frames' float blocks as-is and share df's index and key columns.
+    # Absolute changes are narrowed like the amounts they come from (pct needs float64)
+    pairs = list(zip(month_columns[:-1], month_columns[1:]))
+
+    changes_df = pd.DataFrame(pct, index=df.index, columns=[pct_column_name(p, c) for p, c in pairs], copy=False)
+    integral = [df[p].dtype.kind in "iu" and df[c].dtype.kind in "iu" for p, c in pairs]
+    absolute = compact_changes(absolute, integral) if pairs else absolute
+    if isinstance(absolute, list):
+        # One block per column, as in compact_trial_balance
+        absolute_changes_df = pd.DataFrame(dict(enumerate(absolute)), index=df.index, copy=False)
+        absolute_changes_df.columns = [abs_column_name(p, c) for p, c in pairs]
+    else:
+        absolute_changes_df = pd.DataFrame(
+            absolute, index=df.index, columns=[abs_column_name(p, c) for p, c in pairs], copy=False
+        )
+    for frame in (changes_df, absolute_changes_df):
+        for position, col in enumerate(KEY_COLUMNS):
+            frame.insert(position, col, df[col])
+    return changes_df, absolute_changes_df
+
+
+def build_change_frames_apply(df, month_columns):
+    # Reference implementation: one df.apply per month pair, as app.py used to do
+    changes_df = df[KEY_COLUMNS].copy()
+    for i in range(1, len(month_columns)):
+        current_month = month_columns[i]
+        previous_month = month_columns[i - 1]
+        changes_df[pct_column_name(previous_month, current_month)] = df.apply(
+            lambda row: calculate_change(row, current_month, previous_month), axis=1
+        )
+
+    absolute_changes_df = df[KEY_COLUMNS].copy()
+    for i in range(1, len(month_columns)):
+        current_month = month_columns[i]
+        previous_month = month_columns[i - 1]
+        absolute_changes_df[abs_column_name(previous_month, current_month)] = df[current_month] - df[previous_month]
+    return changes_df, absolute_changes_df
+
+
+def benchmark(df, month_columns):
+    """Time both implementations on ``df`` and check that their outputs agree."""
+    start = time.perf_counter()
+    expected = build_change_frames_apply(df, month_columns)
+    apply_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = build_change_frames(df, month_columns)
+    vectorized_seconds = time.perf_counter() - start
+
+    for exp, act in zip(expected, actual):
+        pd.testing.assert_frame_equal(act, exp, check_dtype=False)
+
+    return {
+        "rows": len(df),
+        "months": len(month_columns),
+        "apply_seconds": apply_seconds,
+        "vectorized_seconds": vectorized_seconds,
+        "speedup": apply_seconds / vectorized_seconds if vectorized_seconds else float("inf"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Month-over-month change engine")
+    parser.add_argument("--benchmark", action="store_true", help="compare against the apply-based implementation")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--months", type=int, default=12)
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    from synthetic import synthetic_trial_balance
+
+    df, month_columns = synthetic_trial_balance(args.rows, args.months)
+    result = benchmark(df, month_columns)
+    print(f"{result['rows']} akun x {result['months']} bulan: outputs identical")
+    print(f"  apply:      {result['apply_seconds']:.3f} s")
+    print(f"  vectorized: {result['vectorized_seconds']:.3f} s")
+    print(f"  speedup:    {result['speedup']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Chart rendering with a byte-level cache.
+
+Charts are drawn on standalone ``matplotlib.figure.Figure`` objects (never
+registered with pyplot) and immediately serialized to PNG or SVG bytes. The
+figure is cleared right after serialization. The bytes are kept in an LRU
+keyed by the data hash, chart type, output format and chart parameters, so
+a cached chart is served without touching matplotlib at all. Cache misses
+for several charts can be rendered in parallel on a thread pool.
+"""
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from cache import LRUCache
+
+# Same output options st.pyplot uses
+SAVEFIG_OPTIONS = {"bbox_inches": "tight", "dpi": 200}
+
+
+def draw_loan_trend(fig, data, month_columns):
+    """Grouped bar chart of every pinjaman account per month; ``data`` is the pinjaman rows."""
+    loan_data = data.set_index('Keterangan')[list(month_columns)].T
+    loan_data.columns.name = 'Keterangan'
+    loan_data.index.name = 'Bulan, Tahun'
+
+    fig.set_layout_engine('constrained')
+    ax = fig.subplots()
+    x = np.arange(len(loan_data.index))
+    width = 0.25
+    multiplier = 0
+    for category, values in loan_data.items():
+        offset = width * multiplier
+        rects = ax.bar(x + offset, values / 1e8, width, label=category)  # Convert to ratusan juta
+        ax.bar_label(rects, padding=3)
+        multiplier += 1
+
+    ax.set_ylabel('Nominal (ratusan juta Rp)')
+    ax.set_title('Tren Pinjaman Bulanan')
+    ax.set_xticks(x + width, loan_data.index)
+    ax.legend(loc='upper left', ncols=3)
+    ax.set_ylim(0, loan_data.max().max() / 1e8 + 1)
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+def draw_account_trend(fig, data, category, month_columns):
+    """Line chart of one account description; ``data`` is its month values."""
+    ax = fig.subplots()
+    ax.plot(list(month_columns), data, marker='o', linewidth=2)
+    ax.set_title(f"Tren Bulanan: {category}")
+    ax.set_ylabel("Nilai (Rp)")
+    ax.set_xlabel("Bulan")
+    ax.grid(True)
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+def draw_loan_composition(fig, data, last_month):
+    """Pie chart of the pinjaman composition; ``data`` has Keterangan, the month and "Persentase (%)"."""
+    import seaborn as sns
+
+    ax = fig.subplots()
+    # Tampilkan semua label di luar pie chart
+    labels = data['Persentase (%)'].apply(lambda x: f"{x:.1f}%")
+    wedges, texts, autotexts = ax.pie(
+        data[last_month],
+        labels=labels,
+        autopct='%1.1f%%',
+        startangle=90,
+        colors=sns.color_palette("Set3", len(data)),
+        labeldistance=1.1
+    )
+    # Tambahkan legenda
+    ax.legend(wedges, data['Keterangan'], title="Keterangan", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1))
+    ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+
+
+CHART_TYPES = {
+    "loan_trend": (draw_loan_trend, (12, 8)),
+    "account_trend": (draw_account_trend, (12, 6)),
+    "loan_composition": (draw_loan_composition, (8, 8)),
+}
+
+
+class ChartRenderer:
+    """Render charts to bytes, memoized in an LRU and parallelized on a thread pool."""
+
+    def __init__(self, cache=None, max_workers=4):
+        self.cache = cache if cache is not None else LRUCache(max_entries=256, max_bytes=128 * 1024 * 1024)
+        self.max_workers = max_workers
+
+    @staticmethod
+    def make_key(data_key, chart_type, params, fmt):
+        return (data_key, chart_type, fmt, json.dumps(params, sort_keys=True, default=str))
+
+    def _render(self, chart_type, params, data, fmt):
+        from matplotlib.figure import Figure
+
+        draw, figsize = CHART_TYPES[chart_type]
+        fig = Figure(figsize=figsize)
+        try:
+            draw(fig, data, **params)
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=fmt, **SAVEFIG_OPTIONS)
+            return buffer.getvalue()
+        finally:
+            # Drop the artists right away instead of waiting for the garbage collector
+            fig.clear()
+
+    def render(self, data_key, chart_type, params, data, fmt="png"):
+        """Return the chart bytes; ``data`` is only used on a cache miss."""
+        key = self.make_key(data_key, chart_type, params, fmt)
+        image = self.cache.get(key)
+        if image is None:
+            image = self._render(chart_type, params, data, fmt)
+            self.cache.put(key, image)
+        return image
+
+    def render_many(self, requests, fmt="png"):
+        """Render ``(data_key, chart_type, params, data)`` requests; misses run in parallel."""
+        keys = [self.make_key(data_key, chart_type, params, fmt) for data_key, chart_type, params, _ in requests]
+        images = [self.cache.get(key) for key in keys]
+        missing = [i for i, image in enumerate(images) if image is None]
+
+        if len(missing) == 1 or self.max_workers == 1:
+            for i in missing:
+                images[i] = self.render(*requests[i], fmt=fmt)
+        elif missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                rendered = executor.map(
+                    lambda i: self._render(requests[i][1], requests[i][2], requests[i][3], fmt), missing
+                )
+                for i, image in zip(missing, rendered):
+                    images[i] = image
+                    self.cache.put(keys[i], image)
+        return images
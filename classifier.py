@@ -0,0 +1,138 @@
+"""Category classification of trial balance rows by their "Keterangan".
+
+Each category group matches either by substring (the expense list: an
+account belongs to it when any category name appears anywhere in its
+description) or exactly (pinjaman/simpanan: the stripped description equals
+a category name). Matching is case-insensitive.
+
+Each substring group is compiled into a single regex and each exact group
+into a hash set, so a whole column is classified in one vectorized pass over
+its distinct values.
+
+The category lists are configurable: pass a mapping to ``CategoryClassifier``
+or point ``$TB_CATEGORIES_FILE`` at a JSON file with the same shape as
+``DEFAULT_CATEGORIES``.
+"""
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+SUBSTRING = "substring"
+EXACT = "exact"
+
+DEFAULT_CATEGORIES = {
+    "expense": {
+        "match": SUBSTRING,
+        "names": [
+            "ATK", "Foto Copy", "Cetakan",
+            "Telephone",
+            "Komputer/IT",
+            "BBM/Transport",
+            "Transport Lainnya",
+            "Listrik & Air",
+            "Sewa",
+            "Perlengkapan Kantor",
+            "Pengiriman",
+            "Konsumsi",
+            "Kantor Lainnya",
+            "Perawatan Gedung", "Perawatan Kantor",
+            "Perawatan Kendaraan",
+            "Perawatan Komputer/IT",
+            "Penyusutan Kendaraan",
+            "Penyusutan komputer/IT",
+            "Peny Perl Elektronik",
+            "Penyusutan peralatan kan",
+            "administrasi Bank",
+            "Elektronik",
+            "Sumbangan",
+            "Perijinan",
+            "Kebersihan",
+        ],
+    },
+    "pinjaman": {
+        "match": EXACT,
+        "names": [
+            "Pinjaman Umum",
+            "Pinjaman Micro Bisnis",
+            "Pinjaman Renovasi Rumah",
+            "Pinjaman Pendidikan Anak",
+            "Pinjaman Sanitasi",
+            "Pinjaman Alat Rumah Tangga",
+        ],
+    },
+    "simpanan": {
+        "match": EXACT,
+        "names": [
+            "Simpanan Sukarela",
+            "Simpanan Hari Raya",
+            "Simpanan Qurban",
+            "Simpanan Pokok",
+            "Simpanan Wajib",
+            "Simpanan Pendidikan & Kesehatan",
+            "Dana Pensiun Anggota",
+        ],
+    },
+}
+
+
+class CategoryClassifier:
+    """Compiled index over the configured category groups."""
+
+    def __init__(self, categories=None):
+        self.categories = categories if categories is not None else DEFAULT_CATEGORIES
+        self.groups = list(self.categories)
+
+        # Substring groups: one compiled alternation per group
+        self._substring_patterns = {}
+        # Exact groups: one hash set of lowercased names per group
+        self._exact_names = {}
+        for group, spec in self.categories.items():
+            names = [name.lower() for name in spec["names"]]
+            if spec["match"] == SUBSTRING:
+                self._substring_patterns[group] = re.compile("|".join(map(re.escape, names))) if names else None
+            elif spec["match"] == EXACT:
+                self._exact_names[group] = frozenset(names)
+            else:
+                raise ValueError(f"Unknown match type {spec['match']!r} for category group {group!r}")
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_env(cls, env_var="TB_CATEGORIES_FILE"):
+        path = os.environ.get(env_var)
+        return cls.from_json(path) if path else cls()
+
+    def masks(self, keterangan):
+        """Return ``{group: boolean Series}`` aligned with ``keterangan``."""
+        # Classify each distinct description once, then broadcast back to rows
+        codes, uniques = pd.factorize(keterangan, use_na_sentinel=False)
+        uniques = pd.Series(uniques, dtype=object)
+        text = uniques.astype(str).str.lower()
+        # Exact matches only apply to string descriptions
+        stripped = text.str.strip().where(uniques.map(type) == str)
+
+        result = {}
+        for group in self.groups:
+            if group in self._substring_patterns:
+                pattern = self._substring_patterns[group]
+                if pattern is None:
+                    unique_mask = np.zeros(len(uniques), dtype=bool)
+                else:
+                    unique_mask = text.str.contains(pattern).to_numpy()
+            else:
+                unique_mask = stripped.isin(self._exact_names[group]).to_numpy()
+            result[group] = pd.Series(unique_mask[codes], index=keterangan.index)
+        return result
+
+    def classify(self, keterangan):
+        """Return a categorical label per row: the first configured group it belongs to."""
+        labels = np.full(len(keterangan), None, dtype=object)
+        for group, mask in reversed(list(self.masks(keterangan).items())):
+            labels[mask.to_numpy()] = group
+        return pd.Series(pd.Categorical(labels, categories=self.groups), index=keterangan.index, name="Kategori")
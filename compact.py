@@ -0,0 +1,189 @@
+"""Compact in-memory layout of normalized trial balances.
+
+``compact_trial_balance`` gives every column of a normalized trial balance
+the smallest dtype that holds its values exactly:
+
+- "Keterangan" (and string "No Akun") become categoricals when values
+  repeat, otherwise Arrow-backed strings, instead of Python ``str`` objects
+- integral month columns become ``int32`` when they fit, else ``int64``
+- fractional month columns become ``float32`` when every value survives the
+  round trip, else stay ``float64``
+
+All frames derived from it (change tables, category tables) share its
+RangeIndex as the one account index, and category subsets are exposed as
+row positions or masks (see ``TrialBalanceAnalysis.category_rows``) instead
+of copies. Absolute (Rp) change columns are narrowed the same way
+(``compact_changes``); percentage changes stay float64.
+
+Run ``python compact.py --benchmark`` to compare the peak memory of one
+analyzed file against the previous object/float64 layout with copied
+category tables. On the synthetic workbooks, peak and retained memory fall
+about 2x, not the severalfold that was the goal: their amounts have gaps
+and run into the billions, so month and absolute change columns stay
+float64. The change matrices alone are then two thirds of what is retained.
+"""
+import argparse
+import json
+import os
+import pickle
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from parsing import coerce_numbers
+
+ARROW_STRING = "string[pyarrow]"
+
+
+def compact_text(series):
+    """Categorical when values repeat, Arrow string when all are ``str``, else unchanged."""
+    if series.dtype != object:
+        return series
+    values = series.to_numpy()
+    is_text = np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+    missing = pd.isna(values)
+    if not (is_text | missing).all():
+        # Mixed ints and strings (e.g. "No Akun") keep their Python types
+        return series
+    if series.nunique(dropna=True) * 2 <= len(series):
+        return series.astype("category")
+    return series.astype(ARROW_STRING)
+
+
+def compact_amounts(values):
+    """Smallest dtype that holds the numeric ``values`` exactly."""
+    values = np.asarray(values)
+    if values.dtype.kind not in "iuf":
+        return values
+    if values.dtype.kind in "iu":
+        if len(values) and np.iinfo(np.int32).min <= values.min() and values.max() <= np.iinfo(np.int32).max:
+            return values.astype(np.int32)
+        return values.astype(np.int64)
+    values = values.astype(np.float64, copy=False)
+    narrowed = values.astype(np.float32)
+    with np.errstate(over="ignore", invalid="ignore"):
+        exact = np.array_equal(narrowed.astype(np.float64), values, equal_nan=True)
+    return narrowed if exact else values
+
+
+def compact_changes(absolute, integral):
+    """Columns of an absolute change matrix, each in the smallest dtype that holds it exactly.
+
+    ``integral[i]`` tells whether column ``i`` is the difference of two integer
+    month columns. Returns ``absolute`` itself when no column narrows, else a
+    list of column arrays that don't keep ``absolute`` alive.
+    """
+    # Most float columns of real amounts already fail float32 on the first rows; only check the rest in full
+    head = absolute[:1024]
+    with np.errstate(over="ignore", invalid="ignore"):
+        candidates = ((head.astype(np.float32) == head) | np.isnan(head)).all(axis=0) | np.asarray(integral, dtype=bool)
+    columns = [absolute[:, i] for i in range(absolute.shape[1])]
+    for i in np.flatnonzero(candidates):
+        columns[i] = compact_amounts(columns[i].astype(np.int64) if integral[i] else columns[i])
+    if all(column.dtype == absolute.dtype for column in columns):
+        return absolute
+    return [column.copy() if column.base is not None else column for column in columns]
+
+
+def compact_trial_balance(df, key_columns, month_columns):
+    """Return ``df[key_columns + month_columns]`` with compact dtypes and a RangeIndex.
+
+    Month columns are coerced with ``parsing.coerce_numbers`` and narrowed one at a
+    time, straight from ``df``; columns that keep their dtype share memory
+    with ``df``.
+    """
+    arrays = [compact_text(df[col]).array for col in key_columns]
+    arrays += [compact_amounts(coerce_numbers(df[col]).to_numpy()) for col in month_columns]
+    # One block per column instead of a consolidated copy; positional keys keep duplicate names intact
+    compacted = pd.DataFrame(dict(enumerate(arrays)), copy=False)
+    compacted.columns = list(key_columns) + list(month_columns)
+    return compacted
+
+
+def frame_nbytes(*frames):
+    """Deep memory usage of ``frames``, counting Python strings and Arrow buffers."""
+    return sum(int(frame.memory_usage(deep=True, index=True).sum()) for frame in frames)
+
+
+def _benchmark_child(raw_path, mode):
+    from analysis import analyze_trial_balance
+    from changes import build_change_frames
+    from classifier import CategoryClassifier
+    from ingest import normalize_trial_balance
+    from table_view import TableView
+
+    with open(raw_path, "rb") as f:
+        raw = pickle.load(f)
+    # NumPy buffers and Python strings are traced; Arrow string buffers are not but are counted in the retained size
+    tracemalloc.start()
+
+    if mode == "legacy":
+        # float64/object layout, copied category frames and category tables, as the app used to keep them
+        df, month_columns = normalize_trial_balance(raw, compact=False)
+        del raw
+        changes_df, absolute_changes_df = build_change_frames(df, month_columns)
+        category_filters = CategoryClassifier().masks(df["Keterangan"])
+        kept = [df, changes_df, absolute_changes_df]
+        for category_filter in category_filters.values():
+            category_df = df[category_filter].copy()
+            accounts = changes_df["No Akun"].isin(category_df["No Akun"])
+            kept += [category_df, changes_df[accounts], absolute_changes_df[accounts]]
+    else:
+        df, month_columns = normalize_trial_balance(raw)
+        del raw
+        analysis = analyze_trial_balance(df, month_columns)
+        kept = [analysis.df, analysis.changes_df, analysis.absolute_changes_df]
+        for group in analysis.category_filters:
+            rows = analysis.category_rows(group)
+            TableView(analysis.changes_df, rows=rows)
+            TableView(analysis.absolute_changes_df, rows=rows)
+    _, peak = tracemalloc.get_traced_memory()
+    print(json.dumps({"peak_bytes": peak, "retained_bytes": frame_nbytes(*kept)}))
+
+
+def benchmark(row_counts, months=60, modes=("legacy", "compact")):
+    """Peak traced memory and retained frame size of one analyzed file, in a fresh process per run."""
+    from profiling import run_benchmark_child
+    from synthetic import synthetic_raw_trial_balance
+
+    results = []
+    for rows in row_counts:
+        fd, raw_path = tempfile.mkstemp(suffix=".pkl")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(synthetic_raw_trial_balance(rows, months), f)
+            for mode in modes:
+                output = run_benchmark_child(__file__, raw_path, mode)
+                results.append({"rows": rows, "months": months, "mode": mode,
+                                "peak_mb": output["peak_bytes"] / 1024 / 1024,
+                                "retained_mb": output["retained_bytes"] / 1024 / 1024})
+        finally:
+            os.remove(raw_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact trial balance layout")
+    parser.add_argument("--benchmark", action="store_true", help="compare memory against the float64/object layout")
+    parser.add_argument("--rows", default="25000,100000", help="comma-separated row counts")
+    parser.add_argument("--months", type=int, default=60)
+    parser.add_argument("--benchmark-child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.benchmark_child:
+        _benchmark_child(*args.benchmark_child)
+        return
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    print(f"{'rows':>8} {'months':>6} {'mode':>8} {'peak (MB)':>10} {'retained (MB)':>14}")
+    for result in benchmark([int(rows) for rows in args.rows.split(",")], months=args.months):
+        print(f"{result['rows']:>8} {result['months']:>6} {result['mode']:>8} "
+              f"{result['peak_mb']:>10.1f} {result['retained_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Row-streaming reader for large xlsx trial balances.
+
+``read_excel_streaming`` reads the first sheet with openpyxl in read-only
+mode, row by row with ``values_only``. Every ``chunk_rows`` rows it
+transposes the buffered rows into column arrays. Amount columns are coerced
+to numbers on the spot with ``parsing.coerce_numbers``, so at most one chunk
+of Python cell objects is alive at a time. The result matches
+``pd.read_excel`` for trial balances:
+
+- blank rows are kept as all-missing rows, except trailing ones
+- missing headers become ``"Unnamed: i"`` and duplicate headers are suffixed
+  ``.1``, ``.2``, ...
+- the columns run to the widest row with data, even under blank headers
+- whole-number columns without gaps are int64
+
+Run ``python excel_stream.py --benchmark`` to compare time and peak memory
+against ``pd.read_excel`` on a synthetic workbook.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from parsing import coerce_numbers
+
+DEFAULT_CHUNK_ROWS = 10000
+
+
+def _data_width(row):
+    # Cells up to the last one with a value
+    return len(row) - next((i for i, value in enumerate(reversed(row)) if value is not None), len(row))
+
+
+def _column_names(header, width):
+    # Same naming pd.read_excel uses for missing and duplicate headers
+    header = (list(header) + [None] * width)[:width]
+    names, seen = [], {}
+    for i, name in enumerate(header):
+        name = f"Unnamed: {i}" if name is None else name
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _numeric_column(chunks):
+    values = np.concatenate(chunks) if chunks else np.empty(0)
+    # read_excel turns whole-number cells into ints; keep int64 when nothing is missing
+    if values.dtype.kind == "f" and len(values) and not np.isnan(values).any() and (values == np.round(values)).all():
+        if np.abs(values).max() < 2 ** 63:
+            return values.astype(np.int64)
+    return values
+
+
+def _text_column(chunks):
+    values = pd.Series(np.concatenate(chunks) if chunks else np.empty(0, dtype=object), dtype=object)
+    # Empty cells are NaN in read_excel, not None
+    values[values.isna()] = np.nan
+    try:
+        # Like read_excel, a column whose cells are all numbers (even stored as text) becomes numeric
+        return pd.to_numeric(values).array
+    except (ValueError, TypeError):
+        return values.infer_objects().array
+
+
+def read_excel_streaming(source, text_columns=("No Akun", "Keterangan"), chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """Read the first sheet of an xlsx file (path or file-like) into a DataFrame.
+
+    Columns named in ``text_columns`` keep their cell values. All other
+    columns are coerced to numbers chunk by chunk. ``progress(rows_read)`` is
+    called after every chunk.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = None
+        for row in rows:
+            if row.count(None) != len(row):
+                header = list(row)
+                break
+        if not header:
+            return pd.DataFrame()
+
+        width = _data_width(header)
+        names = _column_names(header, width)
+        numeric = [name not in text_columns for name in names]
+        chunks = [[] for _ in names]
+        buffer = []
+        rows_read = 0
+        blank_rows = 0
+        blank = (None,) * width
+
+        def widen(new_width):
+            # Data past the last header: add "Unnamed" columns, missing in the rows already flushed
+            nonlocal names, width, blank
+            names = _column_names(header, new_width)
+            flushed = rows_read - len(buffer)
+            for name in names[width:]:
+                numeric.append(name not in text_columns)
+                chunks.append([np.full(flushed, np.nan) if numeric[-1] else np.full(flushed, None, dtype=object)])
+            buffer[:] = [row + (None,) * (new_width - width) for row in buffer]
+            width = new_width
+            blank = (None,) * width
+
+        def flush():
+            block = np.empty((len(buffer), width), dtype=object)
+            block[:] = buffer
+            for j in range(width):
+                column = block[:, j]
+                chunks[j].append(coerce_numbers(column).to_numpy(dtype=np.float64) if numeric[j] else column.copy())
+            buffer.clear()
+            if progress:
+                progress(rows_read)
+
+        for row in rows:
+            if len(row) > width and row[width:].count(None) != len(row) - width:
+                widen(_data_width(row))
+            if len(row) != width:
+                row = (tuple(row) + (None,) * width)[:width]
+            if row.count(None) == width:
+                # Only kept once a later row has data: trailing blank rows are dropped
+                blank_rows += 1
+                continue
+            for row in [blank] * blank_rows + [row]:
+                buffer.append(row)
+                rows_read += 1
+                if len(buffer) == chunk_rows:
+                    flush()
+            blank_rows = 0
+        if buffer:
+            flush()
+    finally:
+        workbook.close()
+
+    columns = {}
+    for j in range(width):
+        columns[j] = _numeric_column(chunks[j]) if numeric[j] else _text_column(chunks[j])
+        # Free the chunks of each column as soon as it is assembled
+        chunks[j] = None
+    df = pd.DataFrame(columns, copy=False)
+    df.columns = names
+    return df
+
+
+def _benchmark_child(path, mode):
+    from ingest import normalize_trial_balance
+    from profiling import peak_rss_bytes
+
+    baseline = peak_rss_bytes()
+    start = time.perf_counter()
+    if mode == "streaming":
+        raw = read_excel_streaming(path)
+    else:
+        raw = pd.read_excel(path)
+    df, month_columns = normalize_trial_balance(raw)
+    seconds, peak = time.perf_counter() - start, peak_rss_bytes()
+    print(json.dumps({"seconds": seconds, "peak_bytes": None if peak is None else peak - baseline}))
+
+
+def benchmark(rows, months, modes=("read_excel", "streaming")):
+    """Seconds to a normalized frame and peak RSS of each reader, in a fresh process per run."""
+    from profiling import megabytes, run_benchmark_child
+    from synthetic import synthetic_raw_trial_balance, write_synthetic_workbook
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    results = []
+    try:
+        # Some amounts typed as Indonesian text, as in real uploads
+        write_synthetic_workbook(path, synthetic_raw_trial_balance(rows, months), text_rate=0.02)
+        for mode in modes:
+            output = run_benchmark_child(__file__, path, mode)
+            results.append({"rows": rows, "months": months, "mode": mode, "seconds": output["seconds"],
+                            "peak_mb": megabytes(output["peak_bytes"])})
+    finally:
+        os.remove(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming xlsx reader")
+    parser.add_argument("--benchmark", action="store_true", help="compare against pd.read_excel")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--benchmark-child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.benchmark_child:
+        _benchmark_child(*args.benchmark_child)
+        return
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    from profiling import format_mb
+
+    print(f"{'mode':>10} {'seconds':>8} {'peak RSS (MB)':>14}")
+    for result in benchmark(args.rows, args.months):
+        print(f"{result['mode']:>10} {result['seconds']:>8.2f} {format_mb(result['peak_mb']):>14}")
+
+
+if __name__ == "__main__":
+    main()
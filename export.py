@@ -0,0 +1,269 @@
+"""Exports of the computed analysis tables.
+
+The Excel report is written by ``ExcelReportWriter`` in xlsxwriter's
+``constant_memory`` mode: rows are streamed chunk by chunk from the computed
+frames straight into a temporary file on disk, so peak memory no longer grows
+with the size of the workbook. Run ``python export.py --benchmark`` to
+measure peak RSS against row count.
+"""
+import argparse
+import io
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+from styling import DEFAULT_THRESHOLDS, add_excel_bands
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def arrow_table(df):
+    """Convert ``df`` to an Arrow table without its index.
+
+    Object key columns can mix ints and strings (e.g. "No Akun"), which Arrow
+    cannot type; they are stored as strings instead.
+    """
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda x: x if pd.isna(x) else str(x))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def to_parquet_bytes(df, compression="zstd"):
+    """Serialize ``df`` to an in-memory Parquet file."""
+    buffer = io.BytesIO()
+    pq.write_table(arrow_table(df), buffer, compression=compression)
+    return buffer.getvalue()
+
+
+def write_parquet(df, path, compression="zstd"):
+    pq.write_table(arrow_table(df), path, compression=compression)
+
+
+def _cell_values(values):
+    # Match pandas' to_excel: NaN/None become blank cells and infinities are
+    # written as the strings "inf"/"-inf"
+    if values.dtype.kind == "f":
+        cells = values.astype(object)
+        cells[np.isnan(values)] = None
+        cells[np.isposinf(values)] = "inf"
+        cells[np.isneginf(values)] = "-inf"
+        return cells.tolist()
+    if values.dtype.kind in "iub":
+        return values.tolist()
+    cells = values.astype(object)
+    cells[pd.isna(cells)] = None
+    return cells.tolist()
+
+
+class ExcelReportWriter:
+    """Stream DataFrames into an xlsx file with bounded memory.
+
+    Sheets must be written one after another; with ``constant_memory`` a
+    sheet's rows are flushed to disk as soon as the next row starts.
+    """
+
+    def __init__(self, path, chunk_size=5000, progress=None, total_sheets=None):
+        self.path = path
+        self.chunk_size = chunk_size
+        # progress(sheets_started, total_sheets, sheet_name) is called as each sheet starts
+        self.progress = progress
+        self.total_sheets = total_sheets
+        self.sheets_started = 0
+        self.workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "tmpdir": os.path.dirname(path) or None})
+        # Same header style pandas uses for to_excel
+        self.header_format = self.workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.workbook.close()
+
+    def _add_worksheet(self, sheet_name):
+        self.sheets_started += 1
+        if self.progress:
+            self.progress(self.sheets_started, self.total_sheets, sheet_name)
+        return self.workbook.add_worksheet(sheet_name)
+
+    def write_frame(self, sheet_name, df, row_mask=None):
+        """Write ``df`` (optionally only the rows where ``row_mask`` is True) to a new sheet.
+
+        Returns the worksheet and the number of data rows written.
+        """
+        worksheet = self._add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, [str(col) for col in df.columns], self.header_format)
+
+        if row_mask is not None:
+            row_mask = np.asarray(row_mask, dtype=bool)
+        row = 1
+        for start in range(0, len(df), self.chunk_size):
+            chunk = df.iloc[start:start + self.chunk_size]
+            if row_mask is not None:
+                chunk = chunk[row_mask[start:start + self.chunk_size]]
+            columns = [_cell_values(chunk.iloc[:, j].to_numpy()) for j in range(chunk.shape[1])]
+            for values in zip(*columns):
+                for col, value in enumerate(values):
+                    if value is not None:
+                        worksheet.write(row, col, value)
+                row += 1
+        return worksheet, row - 1
+
+    def add_change_bands(self, worksheet, df, row_count, thresholds=DEFAULT_THRESHOLDS):
+        """Color the "Perubahan" columns of a sheet written from ``df``."""
+        pct_positions = [j for j, col in enumerate(df.columns) if "Perubahan" in str(col)]
+        if pct_positions and row_count:
+            add_excel_bands(self.workbook, worksheet, 1, pct_positions[0], row_count, pct_positions[-1], thresholds)
+
+    def write_summary(self, sheet_name, month_columns, report_text):
+        worksheet = self._add_worksheet(sheet_name)
+
+        # Format the summary sheet
+        bold_format = self.workbook.add_format({'bold': False, 'font_size': 11})
+        normal_format = self.workbook.add_format({'font_size': 11})
+
+        # Write the report
+        worksheet.write(0, 0, "LAPORAN ANALISIS KEUANGAN", bold_format)
+        worksheet.write(2, 0, "Periode Analisis:", bold_format)
+        worksheet.write(2, 1, f"{month_columns[0]} s.d. {month_columns[-1]}", normal_format)
+
+        row = 4
+        for line in report_text.split('\n'):
+            worksheet.write(row, 0, line, normal_format)
+            row += 1
+        return worksheet
+
+
+def write_analysis_report(path, df, month_columns, changes_df, absolute_changes_df,
+                          category_filters, significant_changes, report_text, chunk_size=5000,
+                          thresholds=DEFAULT_THRESHOLDS, rollups=None, progress=None):
+    """Write the full analysis workbook to ``path``.
+
+    ``category_filters`` maps a sheet label ("Biaya", "Pinjaman", ...) to the
+    boolean row filter of that category; ``significant_changes`` is the
+    combined "Perubahan Signifikan" table. ``rollups`` optionally maps an
+    account group level to its ``(rollup_df, changes_df)``. Percentage sheets
+    are colored with conditional formats for ``thresholds``.
+    ``progress(sheets_started, total_sheets, sheet_name)`` reports progress.
+    """
+    category_filters = {label: np.asarray(category_filter, dtype=bool) for label, category_filter in category_filters.items()}
+    rollups = rollups or {}
+    total_sheets = 5 + 2 * sum(category_filter.any() for category_filter in category_filters.values()) + 2 * len(rollups)
+    with ExcelReportWriter(path, chunk_size=chunk_size, progress=progress, total_sheets=total_sheets) as writer:
+        writer.write_frame('Data Asli', df)
+        worksheet, row_count = writer.write_frame('Perubahan (%)', changes_df)
+        writer.add_change_bands(worksheet, changes_df, row_count, thresholds)
+        writer.write_frame('Perubahan (Rp)', absolute_changes_df)
+
+        for label, category_filter in category_filters.items():
+            if not category_filter.any():
+                continue
+            writer.write_frame(f'Analisis {label}', df, row_mask=category_filter)
+            accounts = df['No Akun'].to_numpy()[category_filter]
+            worksheet, row_count = writer.write_frame(
+                f'Perubahan {label} (%)', changes_df, row_mask=changes_df['No Akun'].isin(accounts).to_numpy()
+            )
+            writer.add_change_bands(worksheet, changes_df, row_count, thresholds)
+
+        for level, (rollup_df, rollup_changes_df) in rollups.items():
+            writer.write_frame(f'Rekap Grup Level {level}', rollup_df)
+            worksheet, row_count = writer.write_frame(f'Perubahan Grup Level {level} (%)', rollup_changes_df)
+            writer.add_change_bands(worksheet, rollup_changes_df, row_count, thresholds)
+
+        writer.write_frame('Perubahan Signifikan', significant_changes)
+        writer.write_summary('Ringkasan Analisis', month_columns, report_text)
+    return path
+
+
+def spool_path(prefix="Analisis_Keuangan_", suffix=".xlsx"):
+    """Return a fresh temporary file path for a report; the caller removes it."""
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def _benchmark_child(rows, months, mode):
+    from changes import build_change_frames
+    from profiling import peak_rss_bytes
+    from significant import find_significant_changes
+    from synthetic import synthetic_trial_balance
+
+    df, month_columns = synthetic_trial_balance(rows, months)
+    changes_df, absolute_changes_df = build_change_frames(df, month_columns)
+    category_filters = {"Biaya": (df.index % 3 == 0), "Pinjaman": (df.index % 3 == 1)}
+    significant_changes = pd.concat(
+        [find_significant_changes(changes_df, pd.Series(mask, index=df.index)) for mask in category_filters.values()]
+    )
+    baseline = peak_rss_bytes()
+
+    if mode == "streaming":
+        path = spool_path()
+        try:
+            write_analysis_report(path, df, month_columns, changes_df, absolute_changes_df,
+                                  category_filters, significant_changes, "Laporan")
+        finally:
+            os.remove(path)
+    else:
+        # The previous in-memory pandas.ExcelWriter path
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+            df.to_excel(writer, sheet_name='Data Asli', index=False)
+            changes_df.to_excel(writer, sheet_name='Perubahan (%)', index=False)
+            absolute_changes_df.to_excel(writer, sheet_name='Perubahan (Rp)', index=False)
+            for label, mask in category_filters.items():
+                df[mask].to_excel(writer, sheet_name=f'Analisis {label}', index=False)
+                changes_df[mask].to_excel(writer, sheet_name=f'Perubahan {label} (%)', index=False)
+            significant_changes.to_excel(writer, sheet_name='Perubahan Signifikan', index=False)
+    print(json.dumps({"baseline_bytes": baseline, "peak_bytes": peak_rss_bytes()}))
+
+
+def benchmark(row_counts, months=24, modes=("in-memory", "streaming")):
+    """Measure peak RSS of each export mode in a fresh process per row count."""
+    from profiling import megabytes, run_benchmark_child
+
+    results = []
+    for rows in row_counts:
+        for mode in modes:
+            output = run_benchmark_child(__file__, rows, months, mode)
+            baseline, peak = megabytes(output["baseline_bytes"]), megabytes(output["peak_bytes"])
+            results.append({"rows": rows, "months": months, "mode": mode, "baseline_mb": baseline,
+                            "peak_mb": peak, "export_mb": None if peak is None else peak - baseline})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analysis report export")
+    parser.add_argument("--benchmark", action="store_true", help="measure peak RSS against row count")
+    parser.add_argument("--rows", default="10000,25000,50000", help="comma-separated row counts")
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--benchmark-child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.benchmark_child:
+        rows, months, mode = args.benchmark_child
+        _benchmark_child(int(rows), int(months), mode)
+        return
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    from profiling import format_mb
+
+    print(f"{'rows':>8} {'mode':>10} {'peak RSS (MB)':>14} {'export (MB)':>12}")
+    for result in benchmark([int(rows) for rows in args.rows.split(",")], months=args.months):
+        print(f"{result['rows']:>8} {result['mode']:>10} "
+              f"{format_mb(result['peak_mb']):>14} {format_mb(result['export_mb']):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""Incremental recomputation for trial balances that grow by one month at a time.
+
+Every month the same trial balance is uploaded again with one more month
+column. ``analyze_incremental`` keeps the previous upload's normalized month
+matrix, its change matrices and its significant-change entries in an
+``IncrementalStore`` (a ``.json`` file plus memory-mapped ``.npy`` arrays per
+dataset key on local disk).
+Rows are matched by "No Akun". Only the adjacent month pairs whose months
+are new or whose values changed are recomputed; everything else is reused.
+The result is identical to a full recompute with
+``changes.build_change_frames`` and ``significant.find_significant_changes``.
+
+Run ``python incremental.py --benchmark`` to replay monthly uploads and
+check every result, including the "Temuan Utama" lines, against a full
+recompute.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from changes import calculate_changes, change_frames_from_arrays
+from significant import RESULT_COLUMNS, SCORE_COLUMN, find_significant_changes, rank_changes, top_k_candidates
+
+STORE_VERSION = 3
+STORE_ARRAYS = ("accounts", "values", "pct", "exceed_rows", "exceed_pairs")
+
+
+def default_store_dir():
+    return os.environ.get(
+        "TB_INCREMENTAL_DIR", os.path.join(os.path.expanduser("~"), ".cache", "analisa-trial-balance", "incremental")
+    )
+
+
+class IncrementalStore:
+    """Local on-disk store of the state of previous analyses, one entry per key.
+
+    An entry is a small ``.json`` file naming a set of ``.npy`` arrays. The
+    arrays are written under a fresh token and never modified, and are loaded
+    memory-mapped, so only the parts that are reused are read. The ``.json``
+    file is replaced in one step, so a reader always sees a complete entry
+    even while another session saves the same key.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or default_store_dir()
+
+    def _base_path(self, key):
+        # Keep file names readable but safe, and unique per key
+        safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(key))[:64]
+        digest = hashlib.sha1(str(key).encode("utf-8")).hexdigest()[:10]
+        return os.path.join(self.root, f"{safe}-{digest}")
+
+    def _array_path(self, key, token, name):
+        return f"{self._base_path(key)}.{token}.{name}.npy"
+
+    def _read_meta(self, key):
+        try:
+            with open(self._base_path(key) + ".json", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("version") == STORE_VERSION else None
+
+    def load(self, key):
+        meta = self._read_meta(key)
+        if meta is None:
+            return None
+        try:
+            arrays = {
+                name: np.load(self._array_path(key, meta["token"], name), mmap_mode="r", allow_pickle=False)
+                for name in STORE_ARRAYS
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+        # Anything else, e.g. arrays of an interrupted save, is treated as missing
+        n_rows, n_months = meta["rows"], len(meta["month_columns"])
+        shapes = {"accounts": (n_rows,), "values": (n_rows, n_months), "pct": (n_rows, n_months - 1)}
+        if any(arrays[name].shape != shape for name, shape in shapes.items()):
+            return None
+        exceed_rows, exceed_pairs = arrays["exceed_rows"], arrays["exceed_pairs"]
+        if exceed_rows.shape != exceed_pairs.shape or exceed_rows.ndim != 1:
+            return None
+        if len(exceed_rows) and (exceed_rows.max() >= n_rows or exceed_pairs.max() >= n_months - 1):
+            return None
+        return meta, arrays
+
+    def save(self, key, meta, arrays):
+        os.makedirs(self.root, exist_ok=True)
+        token = os.urandom(8).hex()
+        paths = [self._array_path(key, token, name) for name in STORE_ARRAYS]
+        fd, meta_path = tempfile.mkstemp(dir=self.root, suffix=".tmp.json")
+        try:
+            for name, path in zip(STORE_ARRAYS, paths):
+                np.save(path, arrays[name], allow_pickle=False)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(dict(meta, version=STORE_VERSION, token=token), f, default=str)
+            os.replace(meta_path, self._base_path(key) + ".json")
+        except Exception:
+            for path in paths + [meta_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        # Every other token is stale, including one a concurrent save of the same key lost the race
+        # with; at worst that save's entry loads as missing and its next run recomputes in full
+        self._remove_arrays(key, exclude=token)
+
+    def _remove_arrays(self, key, exclude=None):
+        prefix = os.path.basename(self._base_path(key)) + "."
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        for name in names:
+            if not (name.startswith(prefix) and name.endswith(".npy")):
+                continue
+            if exclude is not None and name.startswith(prefix + exclude + "."):
+                continue
+            try:
+                os.remove(os.path.join(self.root, name))
+            except OSError:
+                # Already gone, or still memory-mapped by a reader on Windows
+                pass
+
+    def delete(self, key):
+        self._remove_arrays(key)
+        base = self._base_path(key)
+        # .npz is the store file of versions 1 and 2
+        for suffix in (".json", ".npz"):
+            if os.path.exists(base + suffix):
+                os.remove(base + suffix)
+
+
+def _account_keys(accounts):
+    # Integer codes as they are, anything else compared as text (np.save can't store objects)
+    keys = accounts.to_numpy()
+    return keys if keys.dtype.kind in "iu" else keys.astype(str)
+
+
+def _index(positions):
+    # A slice when the positions are consecutive, so NumPy copies blocks instead of gathering elements
+    positions = np.asarray(positions, dtype=np.intp)
+    if len(positions) == 0 or positions[-1] - positions[0] != len(positions) - 1 or np.any(np.diff(positions) != 1):
+        return positions
+    return slice(int(positions[0]), int(positions[-1]) + 1)
+
+
+def _block(rows, cols):
+    # Index of the rows x cols block; two position arrays need np.ix_
+    if isinstance(rows, slice) or isinstance(cols, slice):
+        return rows, cols
+    return np.ix_(rows, cols)
+
+
+def _runs(positions):
+    # Consecutive runs of sorted positions as (start, stop) pairs
+    runs = []
+    for position in positions:
+        if runs and runs[-1][1] == position:
+            runs[-1][1] += 1
+        else:
+            runs.append([position, position + 1])
+    return runs
+
+
+def _exceedances(pct, threshold, rows=slice(None), pairs=None):
+    # (row, pair) positions of |pct| > threshold, restricted to the given rows/pairs
+    pair_positions = np.arange(pct.shape[1]) if pairs is None else np.asarray(pairs, dtype=np.intp)
+    row_positions = np.arange(pct.shape[0])[rows]
+    block = pct[np.ix_(row_positions, pair_positions)]
+    with np.errstate(invalid="ignore"):
+        row_idx, pair_idx = np.nonzero(np.abs(block) > threshold)
+    return row_positions[row_idx], pair_positions[pair_idx]
+
+
+class IncrementalResult:
+    """Change tables of an incremental run plus the reuse statistics."""
+
+    def __init__(self, df, month_columns, pct, absolute, exceedances, threshold, recomputed_pairs, reused_pairs):
+        self.df = df
+        self.month_columns = month_columns
+        self.pct = pct
+        self.absolute = absolute
+        self.exceedances = exceedances
+        self.threshold = threshold
+        self.recomputed_pairs = recomputed_pairs
+        self.reused_pairs = reused_pairs
+
+    def change_frames(self):
+        """Return ``(changes_df, absolute_changes_df)`` like ``build_change_frames``."""
+        return change_frames_from_arrays(self.df, self.month_columns, self.pct, self.absolute)
+
+    def significant_changes(self, category_filter, threshold=None, scores=None, min_score=None, top_k=None):
+        """Same rows and order as ``find_significant_changes`` on the full change table."""
+        if threshold is not None and threshold != self.threshold:
+            return find_significant_changes(self.change_frames()[0], category_filter, threshold=threshold,
+                                            top_k=top_k, scores=scores, min_score=min_score)
+
+        row_idx, pair_idx, values = self.exceedances
+        keep = np.asarray(category_filter, dtype=bool)[row_idx]
+        if scores is not None:
+            # Anomaly scores change with every new month, so they filter the stored exceedances here
+            with np.errstate(invalid="ignore"):
+                keep &= ~(np.asarray(scores)[row_idx, pair_idx] <= min_score)
+        # Already in the row-major order of a full scan, as the final sort expects
+        row_idx, pair_idx, values = row_idx[keep], pair_idx[keep], values[keep]
+        positions = None
+        if top_k is not None:
+            positions = top_k_candidates(values, top_k)
+            row_idx, pair_idx, values = row_idx[positions], pair_idx[positions], values[positions]
+
+        pairs = zip(self.month_columns[:-1], self.month_columns[1:])
+        periods = np.array([f"{p} ke {c}" for p, c in pairs], dtype=object)
+        result = pd.DataFrame({
+            "Kategori": self.df["Keterangan"].to_numpy()[row_idx],
+            "No Akun": self.df["No Akun"].to_numpy()[row_idx],
+            "Periode": periods[pair_idx],
+            "Perubahan (%)": values,
+        }, columns=RESULT_COLUMNS, index=positions)
+        if scores is not None:
+            result[SCORE_COLUMN] = np.asarray(scores)[row_idx, pair_idx].astype(np.float64)
+        return rank_changes(result, top_k)
+
+
+def analyze_incremental(df, month_columns, store, key, threshold=20):
+    """Compute the change tables of ``df``, reusing the state stored under ``key``."""
+    values = df[month_columns].to_numpy(dtype=np.float64)
+    accounts = _account_keys(df["No Akun"])
+    n_rows, n_pairs = len(df), len(month_columns) - 1
+
+    pct = np.empty((n_rows, n_pairs))
+    clean = []
+    known_rows = np.zeros(n_rows, dtype=bool)
+    reused = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp))
+
+    keyed = not df["No Akun"].duplicated().any()
+    previous = store.load(key) if keyed else None
+    removed_accounts = 0
+    if previous is not None and previous[0]["threshold"] == threshold:
+        meta, arrays = previous
+        old_accounts = arrays["accounts"]
+        if old_accounts.dtype.kind == accounts.dtype.kind and np.array_equal(old_accounts, accounts):
+            # Same accounts in the same order, the usual monthly upload: whole-column slices
+            new_rows = old_rows = slice(None)
+            known_rows[:] = True
+            old_to_new_row = np.arange(n_rows)
+        else:
+            position = {account: i for i, account in enumerate(old_accounts.tolist())}
+            previous_rows = np.array([position.get(account, -1) for account in accounts.tolist()], dtype=np.intp)
+            known_rows = previous_rows >= 0
+            new_rows, old_rows = _index(np.flatnonzero(known_rows)), _index(previous_rows[known_rows])
+            removed_accounts = len(old_accounts) - int(known_rows.sum())
+            old_to_new_row = np.full(len(old_accounts), -1, dtype=np.intp)
+            old_to_new_row[previous_rows[known_rows]] = np.flatnonzero(known_rows)
+
+        # A month is unchanged when every matched account has the same value; one comparison of the
+        # bit patterns of all shared months (a NaN or -0.0 with other bits only costs a recompute)
+        previous_months = {month: i for i, month in enumerate(meta["month_columns"])}
+        shared = [(j, previous_months[month]) for j, month in enumerate(month_columns) if month in previous_months]
+        unchanged_months = set()
+        if shared:
+            new_months, old_months = (_index(positions) for positions in zip(*shared))
+            same = np.all(
+                values[_block(new_rows, new_months)].view(np.int64)
+                == arrays["values"][_block(old_rows, old_months)].view(np.int64),
+                axis=0,
+            )
+            unchanged_months = {month_columns[j] for (j, _), unchanged in zip(shared, same) if unchanged}
+
+        previous_pairs = {
+            (p, c): i for i, (p, c) in enumerate(zip(meta["month_columns"][:-1], meta["month_columns"][1:]))
+        }
+        reuse = [
+            (i, previous_pairs[pair]) for i, pair in enumerate(zip(month_columns[:-1], month_columns[1:]))
+            if pair in previous_pairs and pair[0] in unchanged_months and pair[1] in unchanged_months
+        ]
+        if reuse:
+            clean = [i for i, _ in reuse]
+            new_pairs, old_pairs = (_index(positions) for positions in zip(*reuse))
+            pct[_block(new_rows, new_pairs)] = arrays["pct"][_block(old_rows, old_pairs)]
+
+            # Carry over significant entries of reused pairs for matched accounts
+            old_to_new_pair = np.full(len(previous_pairs), -1, dtype=np.intp)
+            for i, old in reuse:
+                old_to_new_pair[old] = i
+            exceed_rows = old_to_new_row[np.asarray(arrays["exceed_rows"])]
+            exceed_pairs = old_to_new_pair[np.asarray(arrays["exceed_pairs"])]
+            keep = (exceed_rows >= 0) & (exceed_pairs >= 0)
+            reused = (exceed_rows[keep], exceed_pairs[keep])
+
+    # Recompute dirty pairs for every row, and every pair for accounts not seen before
+    pieces = [reused]
+    clean_set = set(clean)
+    dirty = [i for i in range(n_pairs) if i not in clean_set]
+    for start, stop in _runs(dirty):
+        pct[:, start:stop] = calculate_changes(values[:, start:stop + 1])[0]
+    if dirty:
+        pieces.append(_exceedances(pct, threshold, pairs=dirty))
+    new_accounts = np.flatnonzero(~known_rows)
+    if clean and len(new_accounts):
+        sub_pct, _ = calculate_changes(values[new_accounts])
+        pct[np.ix_(new_accounts, clean)] = sub_pct[:, clean]
+        pieces.append(_exceedances(pct, threshold, rows=new_accounts, pairs=clean))
+    # Cheaper to recompute than to store and load
+    absolute = values[:, 1:] - values[:, :-1]
+
+    # Row-major, the order of a full scan. Each piece is mostly in that order already, and the stable
+    # sort (timsort) merges such runs in about linear time
+    exceed_rows, exceed_pairs = (np.concatenate(parts) for parts in zip(*pieces))
+    order = np.argsort(exceed_rows * n_pairs + exceed_pairs, kind="stable")
+    exceed_rows, exceed_pairs = exceed_rows[order], exceed_pairs[order]
+    exceedances = (exceed_rows, exceed_pairs, pct[exceed_rows, exceed_pairs])
+
+    # Reruns on an unchanged upload don't need to touch the store
+    if keyed and (previous is None or dirty or len(new_accounts) or removed_accounts):
+        store.save(
+            key,
+            {"rows": n_rows, "month_columns": list(month_columns), "threshold": threshold},
+            {
+                "accounts": accounts, "values": values, "pct": pct,
+                "exceed_rows": exceed_rows.astype(np.int32), "exceed_pairs": exceed_pairs.astype(np.int32),
+            },
+        )
+
+    return IncrementalResult(df, month_columns, pct, absolute, exceedances, threshold,
+                             recomputed_pairs=dirty, reused_pairs=clean)
+
+
+def _analyze(upload, month_columns, incremental_result=None, anomaly_settings=None):
+    # What the app computes for an upload: change tables, significant changes and "Temuan Utama"
+    from analysis import analyze_trial_balance
+
+    analysis = analyze_trial_balance(upload, month_columns, incremental_result=incremental_result,
+                                     anomaly_settings=anomaly_settings)
+    analysis.all_significant_changes()
+    analysis.summary_findings()
+    return analysis
+
+
+def benchmark(rows, months, first_months=12, repeat=3):
+    """Upload the first ``first_months`` months, then one more each time, comparing with full recomputes.
+
+    Times are the best of ``repeat`` runs, each from the store state of the
+    previous upload, without anomaly scoring (the same work on both paths).
+    Every result must be identical to the full recompute, and every upload
+    after the first must be faster.
+    """
+    from anomaly import DEFAULT_ANOMALY_SETTINGS
+    from changes import build_change_frames
+    from synthetic import synthetic_trial_balance
+
+    df, month_columns = synthetic_trial_balance(rows, months)
+    store = IncrementalStore(tempfile.mkdtemp())
+    results = []
+    for n in range(first_months, months + 1):
+        upload = df[["No Akun", "Keterangan"] + month_columns[:n]]
+        previous = df[["No Akun", "Keterangan"] + month_columns[:n - 1]] if n > first_months else None
+        incremental_times, full_times = [], []
+        for run in range(repeat):
+            key = f"benchmark-{run}"
+            store.delete(key)
+            if previous is not None:
+                analyze_incremental(previous, month_columns[:n - 1], store, key)
+            start = time.perf_counter()
+            incremental_result = analyze_incremental(upload, month_columns[:n], store, key)
+            _analyze(upload, month_columns[:n], incremental_result)
+            incremental_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            _analyze(upload, month_columns[:n])
+            full_times.append(time.perf_counter() - start)
+
+        incremental = _analyze(upload, month_columns[:n], incremental_result, DEFAULT_ANOMALY_SETTINGS)
+        full = _analyze(upload, month_columns[:n], anomaly_settings=DEFAULT_ANOMALY_SETTINGS)
+        changes_df, absolute_changes_df = build_change_frames(upload, month_columns[:n])
+        pd.testing.assert_frame_equal(incremental.changes_df, changes_df)
+        pd.testing.assert_frame_equal(incremental.absolute_changes_df, absolute_changes_df)
+        for group in full.category_filters:
+            pd.testing.assert_frame_equal(incremental.significant_changes(group), full.significant_changes(group))
+        # What users read: the largest change per category
+        assert incremental.summary_findings() == full.summary_findings()
+
+        result = {
+            "months": n, "recomputed_pairs": len(incremental_result.recomputed_pairs),
+            "incremental_seconds": min(incremental_times), "full_seconds": min(full_times),
+        }
+        if previous is not None:
+            assert result["incremental_seconds"] < result["full_seconds"], f"incremental is slower: {result}"
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental recomputation of monthly uploads")
+    parser.add_argument("--benchmark", action="store_true", help="replay monthly uploads against full recomputes")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per upload; the best time counts")
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    for result in benchmark(args.rows, args.months, repeat=args.repeat):
+        print(f"{args.rows} akun x {result['months']} bulan: outputs identical, "
+              f"{result['recomputed_pairs']} pasangan bulan dihitung ulang")
+        print(f"  inkremental: {result['incremental_seconds']:.3f} s")
+        print(f"  penuh:       {result['full_seconds']:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
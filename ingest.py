@@ -0,0 +1,151 @@
+"""Reading and normalizing uploaded trial balances.
+
+``load_trial_balance`` turns the raw bytes of an upload into the normalized
+frame the analysis works on: month headers reformatted to ``mmm-yyyy`` and
+month columns coerced to numbers. Results can be memoized in an
+``IngestCache`` so reruns skip the expensive workbook parsing.
+
+Besides Excel, trial balances can be read from Parquet, Feather/Arrow IPC and
+CSV. Columnar formats are read zero-copy from the uploaded buffer, or
+memory-mapped when reading from a path. xlsx workbooks are streamed row by
+row (see ``excel_stream``); legacy xls files go through ``pd.read_excel``.
+Month headers and amounts are parsed with ``parsing``, which also accepts
+fallback date formats and Indonesian-formatted numbers.
+"""
+import io
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from compact import compact_trial_balance
+from excel_stream import read_excel_streaming
+from parsing import DEFAULT_DATE_FORMAT, coerce_numbers, format_month_headers
+from profiling import profile_stage
+
+REQUIRED_COLUMNS = ["No Akun", "Keterangan"]
+
+
+class TrialBalanceError(ValueError):
+    """Raised when an upload does not look like a trial balance."""
+
+
+EXCEL_EXTENSIONS = ("xlsx", "xls")
+PARQUET_EXTENSIONS = ("parquet", "pq")
+ARROW_EXTENSIONS = ("feather", "arrow", "ipc")
+CSV_EXTENSIONS = ("csv",)
+SUPPORTED_EXTENSIONS = EXCEL_EXTENSIONS + PARQUET_EXTENSIONS + ARROW_EXTENSIONS + CSV_EXTENSIONS
+
+
+def detect_format(filename):
+    """Return the file extension used to pick a reader, e.g. ``"parquet"``."""
+    extension = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    if not extension:
+        # Unnamed uploads were always treated as Excel
+        return "xlsx"
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise TrialBalanceError(f"Format file '.{extension}' tidak didukung")
+    return extension
+
+
+def _read_arrow_ipc(source):
+    # Feather v2 is the Arrow IPC file format; fall back to the streaming format
+    try:
+        return pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pa.ipc.open_stream(source).read_all()
+
+
+def read_trial_balance(data, filename=None):
+    """Read uploaded bytes into a raw DataFrame based on the file extension."""
+    file_format = detect_format(filename)
+    if file_format in PARQUET_EXTENSIONS:
+        return pq.read_table(pa.BufferReader(data)).to_pandas()
+    if file_format in ARROW_EXTENSIONS:
+        return _read_arrow_ipc(pa.BufferReader(data)).to_pandas()
+    if file_format in CSV_EXTENSIONS:
+        return pd.read_csv(io.BytesIO(data))
+    if file_format == "xlsx":
+        return read_excel_streaming(io.BytesIO(data), text_columns=REQUIRED_COLUMNS)
+    return pd.read_excel(io.BytesIO(data))
+
+
+def read_trial_balance_file(path):
+    """Read a trial balance from disk, memory-mapping columnar formats."""
+    file_format = detect_format(path)
+    if file_format in PARQUET_EXTENSIONS:
+        return pq.read_table(path, memory_map=True).to_pandas()
+    if file_format in ARROW_EXTENSIONS:
+        with pa.memory_map(path, "r") as source:
+            return _read_arrow_ipc(source).to_pandas()
+    if file_format in CSV_EXTENSIONS:
+        return pd.read_csv(path)
+    if file_format == "xlsx":
+        return read_excel_streaming(path, text_columns=REQUIRED_COLUMNS)
+    return pd.read_excel(path)
+
+
+def normalize_trial_balance(df, date_format=DEFAULT_DATE_FORMAT, compact=True):
+    """Validate ``df`` and return the normalized ``(df, month_columns)``.
+
+    With ``compact`` the columns get the compact dtypes of
+    ``compact.compact_trial_balance``; otherwise months stay float64/int64.
+    """
+    # Check if the required columns exist
+    if not all(col in df.columns for col in REQUIRED_COLUMNS):
+        raise TrialBalanceError("File harus memiliki kolom 'No Akun' dan 'Keterangan'")
+
+    # Identify month columns
+    month_columns = [col for col in df.columns if col not in REQUIRED_COLUMNS]
+    if len(month_columns) < 2:
+        raise TrialBalanceError("Data harus memiliki minimal 2 bulan untuk melakukan analisis perubahan")
+
+    # Reformat all parseable month headers to mmm-yyyy at once
+    with profile_stage("parse_headers", months=len(month_columns)):
+        month_columns_formatted = format_month_headers(month_columns, date_format)
+
+    if compact:
+        # Coerce and narrow each month column straight from the upload, without a float64 copy of the table
+        with profile_stage("to_numeric", rows=len(df), months=len(month_columns)):
+            df = compact_trial_balance(df, REQUIRED_COLUMNS, month_columns)
+        df.columns = REQUIRED_COLUMNS + month_columns_formatted
+        month_columns = month_columns_formatted
+        return df, month_columns
+
+    # Put the key columns first, followed by the months in file order
+    df = df[REQUIRED_COLUMNS + month_columns]
+    df.columns = REQUIRED_COLUMNS + month_columns_formatted
+    month_columns = month_columns_formatted
+
+    # Convert month columns to numeric
+    with profile_stage("to_numeric", rows=len(df), months=len(month_columns)):
+        for col in month_columns:
+            df[col] = coerce_numbers(df[col])
+
+    return df, month_columns
+
+
+def parser_options(filename=None, date_format=DEFAULT_DATE_FORMAT):
+    """Options that, together with the file bytes, determine the parsed result."""
+    return {"format": detect_format(filename), "date_format": date_format}
+
+
+def load_trial_balance(data, filename=None, date_format=DEFAULT_DATE_FORMAT, cache=None):
+    """Parse and normalize the uploaded bytes, using ``cache`` when given."""
+    options = parser_options(filename, date_format)
+    if cache is not None:
+        key = cache.make_key(data, options)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    with profile_stage("read", format=options["format"], bytes=len(data)) as stage:
+        raw = read_trial_balance(data, filename)
+        stage.set(rows=len(raw), months=len(raw.columns) - len(REQUIRED_COLUMNS))
+    df, month_columns = normalize_trial_balance(raw, date_format=date_format)
+
+    if cache is not None:
+        cache.put(key, (df, month_columns))
+    return df, month_columns
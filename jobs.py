@@ -0,0 +1,368 @@
+"""Background generation of Excel reports.
+
+The app submits a ``ReportRequest`` and gets a ``ReportJob`` back right
+away; the page only polls the job's status and progress. Requests are keyed
+by a hash of the upload and the report text, so submitting the same inputs
+again (e.g. a second click) returns the queued, running or finished job
+instead of starting another export. Finished reports stay on disk (or in
+Redis) for re-download.
+
+Two queues share that interface:
+
+- ``LocalReportQueue``: a thread pool in the app process, shared by all
+  sessions; a slow export only occupies one of its workers
+- ``RedisReportQueue``: jobs are pushed to a Redis list and exported by
+  separate worker processes (``python jobs.py worker``), which rebuild the
+  analysis from the stored upload and put the finished workbook back in
+  Redis. Set ``TB_REPORT_QUEUE=redis`` and ``REDIS_URL`` to use it. Requests
+  are pickled, so only point this at a Redis instance the app trusts. A job
+  still running ``TB_REPORT_LEASE_SECONDS`` after a worker started it is
+  taken as failed (the worker died), so the next submit queues it again.
+
+A request made with ``profile=True`` is exported under its own
+``profiling.Profiler`` (times only: tracemalloc is process wide) and the
+job keeps its ``summary()`` in ``profile``, so the session's profiler is
+never shared with the worker.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+KEY_PREFIX = "tb:report:"
+QUEUE_NAME = KEY_PREFIX + "queue"
+
+# Finished and partial report files, named by the request key
+REPORT_FILE = re.compile(r"[0-9a-f]{64}\.xlsx(\.part)?")
+
+
+def default_report_dir():
+    return os.environ.get(
+        "TB_REPORT_DIR", os.path.join(os.path.expanduser("~"), ".cache", "analisa-trial-balance", "reports")
+    )
+
+
+class ReportRequest:
+    """Inputs of one Excel report.
+
+    ``data`` and ``file_name`` are the upload, used by workers that have to
+    rebuild the analysis. ``analysis`` is the already computed
+    ``TrialBalanceAnalysis``, if any; it is never pickled. With ``profile``
+    the export's stages are recorded on the job.
+    """
+
+    def __init__(self, data_key, data, file_name, report_text, analysis=None, profile=False):
+        self.data_key = data_key
+        self.data = data
+        self.file_name = file_name
+        self.report_text = report_text
+        self.analysis = analysis
+        self.profile = profile
+
+    @property
+    def key(self):
+        digest = hashlib.sha256(self.data_key.encode("utf-8"))
+        digest.update((self.report_text or "").encode("utf-8"))
+        return digest.hexdigest()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["analysis"] = None
+        return state
+
+
+class ReportJob:
+    """Status of one report: ``status``, ``progress`` (0-1), the sheet being written, any error and profile."""
+
+    FIELDS = ("key", "status", "progress", "message", "error", "path", "created_at", "started_at", "finished_at",
+              "profile")
+
+    def __init__(self, key, status=QUEUED, progress=0.0, message="", error=None, path=None, created_at=None,
+                 started_at=None, finished_at=None, profile=None):
+        self.key = key
+        self.status = status
+        self.progress = progress
+        self.message = message
+        self.error = error
+        self.path = path
+        self.created_at = created_at if created_at is not None else time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.profile = profile
+
+    @property
+    def pending(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, values):
+        # Missing fields keep their defaults, e.g. a job hash claimed but not written yet is queued
+        return cls(**{field: values[field] for field in cls.FIELDS if field in values})
+
+
+def build_report(request, path, progress=None):
+    """Write the report of ``request`` to ``path``, analyzing the upload first if needed.
+
+    Returns the profiler summary of the export when ``request.profile`` is set, else None.
+    """
+    from profiling import Profiler, use_profiler
+
+    # Worker threads are reused: always set their profiler, even to None
+    profiler = Profiler() if request.profile else None
+    use_profiler(profiler)
+    try:
+        _build_report(request, path, progress)
+    finally:
+        use_profiler(None)
+    return profiler.summary() if profiler is not None else None
+
+
+def _build_report(request, path, progress):
+    analysis = request.analysis
+    if analysis is None:
+        from analysis import analyze_trial_balance
+        from anomaly import AnomalySettings
+        from classifier import CategoryClassifier
+        from ingest import load_trial_balance
+        from styling import BandThresholds
+
+        df, month_columns = load_trial_balance(request.data, request.file_name)
+        analysis = analyze_trial_balance(df, month_columns, classifier=CategoryClassifier.from_env(),
+                                         thresholds=BandThresholds.from_env(),
+                                         anomaly_settings=AnomalySettings.from_env())
+    analysis.write_excel_report(path, request.report_text, progress=progress)
+
+
+def _progress_callback(job, update):
+    def progress(sheets_started, total_sheets, sheet_name):
+        # A sheet is done when the next one starts
+        job.progress = (sheets_started - 1) / total_sheets if total_sheets else 0.0
+        job.message = sheet_name
+        update(job)
+    return progress
+
+
+class LocalReportQueue:
+    """Reports exported by a thread pool in this process, kept in ``report_dir``.
+
+    At most ``max_reports`` finished reports are kept, counting those left in
+    ``report_dir`` by earlier processes. Partial files older than
+    ``stale_part_seconds`` are removed too.
+    """
+
+    def __init__(self, workers=2, report_dir=None, max_reports=32, stale_part_seconds=3600):
+        self.report_dir = report_dir or default_report_dir()
+        self.max_reports = max_reports
+        self.stale_part_seconds = stale_part_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, request):
+        """Queue ``request``, or return the existing job for the same inputs."""
+        with self._lock:
+            job = self._jobs.get(request.key)
+            if job is not None and (job.pending or job.status == DONE and os.path.exists(job.path)):
+                self._jobs.move_to_end(request.key)
+                return job
+            job = ReportJob(request.key, path=os.path.join(self.report_dir, f"{request.key}.xlsx"))
+            self._jobs[request.key] = job
+            self._evict()
+        self._executor.submit(self._run, job, request)
+        return job
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def open_report(self, job):
+        return open(job.path, "rb")
+
+    def _run(self, job, request):
+        job.status = RUNNING
+        job.started_at = time.time()
+        # Written next to the final path and renamed, so a half-written report is never served
+        part_path = f"{job.path}.part"
+        try:
+            os.makedirs(self.report_dir, exist_ok=True)
+            job.profile = build_report(request, part_path, progress=_progress_callback(job, lambda job: None))
+            os.replace(part_path, job.path)
+            job.progress = 1.0
+            job.status = DONE
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        job.finished_at = time.time()
+
+    def _evict(self):
+        # Drop the oldest finished jobs and their files beyond max_reports
+        finished = [key for key, job in self._jobs.items() if not job.pending]
+        for key in finished[:max(0, len(self._jobs) - self.max_reports)]:
+            job = self._jobs.pop(key)
+            if job.path and os.path.exists(job.path):
+                os.remove(job.path)
+
+        # Files of earlier processes (or other app replicas) this queue doesn't track: keep only the
+        # newest reports that fit next to the tracked ones
+        tracked = {path for job in self._jobs.values() if job.path for path in (job.path, f"{job.path}.part")}
+        try:
+            names = os.listdir(self.report_dir)
+        except OSError:
+            return
+        reports, now = [], time.time()
+        for name in names:
+            path = os.path.join(self.report_dir, name)
+            if path in tracked or not REPORT_FILE.fullmatch(name):
+                continue
+            try:
+                mtime = os.path.getmtime(path)
+                if not name.endswith(".part"):
+                    reports.append((mtime, path))
+                elif now - mtime > self.stale_part_seconds:
+                    os.remove(path)
+            except OSError:
+                pass
+        reports.sort(reverse=True)
+        for _, path in reports[max(0, self.max_reports - len(self._jobs)):]:
+            try:
+                os.remove(path)
+            except OSError:
+                # Removed by another process, or open in a download on Windows
+                pass
+
+
+class RedisReportQueue:
+    """Reports exported by ``python jobs.py worker`` processes through Redis.
+
+    A running job is leased to its worker for ``lease_seconds`` from ``started_at``.
+    """
+
+    def __init__(self, client, ttl_seconds=24 * 3600, lease_seconds=3600):
+        self.redis = client
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+
+    def _job_key(self, key):
+        return f"{KEY_PREFIX}job:{key}"
+
+    def _save(self, job):
+        values = {field: json.dumps(value) for field, value in job.to_dict().items()}
+        self.redis.hset(self._job_key(job.key), mapping=values)
+        self.redis.expire(self._job_key(job.key), self.ttl_seconds)
+
+    def submit(self, request):
+        """Queue ``request``, or return the existing job for the same inputs."""
+        job = self.get(request.key)
+        if job is not None:
+            if job.pending or job.status == DONE and self.redis.exists(f"{KEY_PREFIX}report:{request.key}"):
+                return job
+            # Failed, or the report expired: start over
+            self.redis.delete(self._job_key(request.key))
+        # Creating the job hash is the claim: only one submitter wins, even across app replicas
+        if not self.redis.hsetnx(self._job_key(request.key), "key", json.dumps(request.key)):
+            # The winner may not have written the job yet; it is queued either way
+            return self.get(request.key) or ReportJob(request.key)
+        job = ReportJob(request.key)
+        self.redis.set(f"{KEY_PREFIX}input:{request.key}", pickle.dumps(request, protocol=pickle.HIGHEST_PROTOCOL),
+                       ex=self.ttl_seconds)
+        self._save(job)
+        self.redis.lpush(QUEUE_NAME, request.key)
+        return job
+
+    def get(self, key):
+        values = self.redis.hgetall(self._job_key(key))
+        if not values:
+            return None
+        job = ReportJob.from_dict({
+            (field.decode() if isinstance(field, bytes) else field): json.loads(value)
+            for field, value in values.items()
+        })
+        if job.status == RUNNING and job.started_at is not None and time.time() - job.started_at > self.lease_seconds:
+            # The worker died (or hangs) with the job: fail it so a new submit queues it again
+            job.status = FAILED
+            job.error = f"TimeoutError: no worker finished the report within {self.lease_seconds:g} s"
+            job.finished_at = time.time()
+            self._save(job)
+        return job
+
+    def open_report(self, job):
+        return io.BytesIO(self.redis.get(f"{KEY_PREFIX}report:{job.key}") or b"")
+
+    def work(self, timeout=5, once=False):
+        """Export queued reports until stopped; with ``once``, return after one job or an idle timeout."""
+        while True:
+            item = self.redis.brpop(QUEUE_NAME, timeout=timeout)
+            if item is not None:
+                key = item[1].decode() if isinstance(item[1], bytes) else item[1]
+                self._run(key)
+            if once:
+                return
+
+    def _run(self, key):
+        job = self.get(key) or ReportJob(key)
+        payload = self.redis.get(f"{KEY_PREFIX}input:{key}")
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._save(job)
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            if payload is None:
+                raise LookupError("input of the report expired")
+            job.profile = build_report(pickle.loads(payload), path, progress=_progress_callback(job, self._save))
+            with open(path, "rb") as f:
+                self.redis.set(f"{KEY_PREFIX}report:{key}", f.read(), ex=self.ttl_seconds)
+            job.progress = 1.0
+            job.status = DONE
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+        finally:
+            os.remove(path)
+        job.finished_at = time.time()
+        self._save(job)
+
+
+def report_queue_from_env():
+    """The Redis queue when TB_REPORT_QUEUE=redis, else a local pool of TB_REPORT_WORKERS threads."""
+    if os.environ.get("TB_REPORT_QUEUE", "").lower() == "redis":
+        from cache import redis_client_from_env
+
+        client = redis_client_from_env()
+        if client is None:
+            raise RuntimeError("TB_REPORT_QUEUE=redis needs REDIS_URL")
+        return RedisReportQueue(client, lease_seconds=float(os.environ.get("TB_REPORT_LEASE_SECONDS", 3600)))
+    return LocalReportQueue(workers=int(os.environ.get("TB_REPORT_WORKERS", 2)))
+
+
+def main():
+    from cache import redis_client_from_env
+
+    parser = argparse.ArgumentParser(description="Excel report worker for TB_REPORT_QUEUE=redis")
+    parser.add_argument("command", choices=["worker"])
+    parser.add_argument("--once", action="store_true", help="export at most one queued report and exit")
+    args = parser.parse_args()
+
+    client = redis_client_from_env()
+    if client is None:
+        parser.error("REDIS_URL is not set")
+    RedisReportQueue(client).work(once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Vectorized parsing of month headers and amounts.
+
+``format_month_headers`` parses all month headers at once, trying the
+configured date format first and then ``FALLBACK_DATE_FORMATS``, one
+vectorized ``pd.to_datetime`` call per format over the headers still
+unparsed. Parsed headers become ``mmm-yyyy``; the rest are kept as they are.
+
+``coerce_numbers`` is ``pd.to_numeric(errors="coerce")`` that also reads
+amounts typed as Indonesian-formatted text: ``"1.234.567,89"`` (dot
+thousands separators, comma decimals), ``"Rp 1.500"`` and accounting
+negatives such as ``"(1.234,00)"``. Text is only treated as Indonesian when
+it has that shape, so ``"1234.5"`` is still 1234.5, while ``"1.234"`` is
+read as 1234.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DATE_FORMAT = "%Y-%m-%d %H.%M.%S"
+
+# Tried in order after the configured format
+FALLBACK_DATE_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d",
+    "%d/%m/%Y",
+    "%m/%Y",
+    "%b-%Y",
+    "%b %Y",
+    "%B %Y",
+)
+
+MONTH_HEADER_FORMAT = "%b-%Y"
+
+# infer_dtype results of object columns that contain strings
+TEXT_TYPES = ("string", "mixed", "mixed-integer")
+
+# "1.234.567,89", "1.234" or "1234,5"
+INDONESIAN_NUMBER = r"^[+-]?(?:\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+,\d+)$"
+
+
+def format_month_headers(columns, date_format=DEFAULT_DATE_FORMAT, fallback_formats=FALLBACK_DATE_FORMATS):
+    """Return ``columns`` with every parseable date header reformatted to ``mmm-yyyy``."""
+    headers = pd.Series(list(columns), dtype=object)
+    parsed = pd.Series(pd.NaT, index=headers.index, dtype="datetime64[ns]")
+
+    # Headers stored as real Excel dates arrive as datetime objects
+    is_date = headers.map(lambda header: isinstance(header, (datetime.date, np.datetime64))).to_numpy(dtype=bool)
+    if is_date.any():
+        parsed[is_date] = pd.to_datetime(headers[is_date], errors="coerce")
+
+    text = pd.Series([header.strip() if isinstance(header, str) else None for header in headers], dtype=object)
+    for date_format in (date_format, *fallback_formats):
+        remaining = parsed.isna() & text.notna()
+        if not remaining.any():
+            break
+        parsed[remaining] = pd.to_datetime(text[remaining], format=date_format, errors="coerce")
+
+    formatted = parsed.dt.strftime(MONTH_HEADER_FORMAT)
+    return [header if pd.isna(month) else month for header, month in zip(columns, formatted)]
+
+
+def coerce_numbers(values):
+    """Coerce ``values`` to numbers, reading Indonesian-formatted text; unparseable values become NaN."""
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    if series.dtype != object or pd.api.types.infer_dtype(series, skipna=True) not in TEXT_TYPES:
+        return pd.to_numeric(series, errors="coerce")
+
+    # NaN for everything that is not a string
+    text = series.str.strip()
+    is_text = text.notna().to_numpy()
+    if not is_text.any():
+        return pd.to_numeric(series, errors="coerce")
+
+    text = text[is_text]
+    negative = (text.str.startswith("(") & text.str.endswith(")")).to_numpy()
+    text = text.str.replace(r"^\((.*)\)$", r"\1", regex=True)
+    text = text.str.replace(r"^[Rr][Pp]\.?\s*", "", regex=True).str.replace(" ", "", regex=False)
+    indonesian = text.str.match(INDONESIAN_NUMBER).to_numpy()
+    if indonesian.any():
+        text[indonesian] = text[indonesian].str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    parsed = pd.to_numeric(text, errors="coerce").to_numpy(dtype=np.float64)
+    parsed[negative] = -parsed[negative]
+
+    numbers = pd.to_numeric(series.where(~is_text), errors="coerce").to_numpy(dtype=np.float64)
+    numbers[is_text] = parsed
+    return pd.Series(numbers, index=series.index, name=series.name)
@@ -0,0 +1,324 @@
+"""Per-stage timing and memory instrumentation of the analysis pipeline.
+
+Pipeline code wraps its stages in ``profile_stage("read", rows=...)``.
+Nothing is recorded unless a ``Profiler`` has been made active for the
+current context with ``use_profiler``. Without one, ``profile_stage`` returns
+a shared no-op object, so disabled instrumentation costs one context variable
+lookup per stage.
+
+An active profiler records for every stage:
+
+- the wall time
+- the CPU time of the calling thread
+- the peak memory traced by ``tracemalloc``, only when ``track_memory`` is on
+  because tracing slows down allocation-heavy code
+- the process peak RSS, where the ``resource`` module exists (not on Windows)
+- the input dimensions passed by the stage (rows, months, ...)
+
+Records can be logged as one JSON line per stage or written as a
+Prometheus text exposition file, e.g. for node_exporter's textfile collector.
+
+Usage::
+
+    python profiling.py data.xlsx --memory --prometheus tb.prom
+"""
+import argparse
+import contextvars
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger("analisa_trial_balance.profile")
+
+_active_profiler = contextvars.ContextVar("active_profiler", default=None)
+
+# Input dimensions exported as Prometheus gauges
+DIMENSION_METRICS = ("rows", "months")
+
+
+class _NullStage:
+    """Stand-in for a stage when profiling is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **dims):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name, dims):
+        self.profiler = profiler
+        self.record = {"stage": name, **dims}
+
+    def set(self, **dims):
+        """Add input dimensions that are only known inside the stage."""
+        self.record.update(dims)
+
+    def __enter__(self):
+        self.profiler._enter(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record["wall_seconds"] = time.perf_counter() - self._wall
+        self.record["cpu_seconds"] = time.thread_time() - self._cpu
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        self.profiler._exit(self)
+        return False
+
+
+class Profiler:
+    """Collects one record per executed pipeline stage."""
+
+    def __init__(self, track_memory=False, log_records=False, prometheus_path=None, labels=None):
+        self.track_memory = track_memory
+        self.log_records = log_records
+        self.prometheus_path = prometheus_path
+        self.labels = dict(labels or {})
+        self.records = []
+        self._lock = threading.Lock()
+        # Open stages per thread, so stages of concurrent threads never pop each other
+        self._local = threading.local()
+        self._started_tracing = False
+
+    @classmethod
+    def from_env(cls):
+        """Profiler configured by TB_PROFILE*, or None when TB_PROFILE is not set."""
+        if os.environ.get("TB_PROFILE", "") in ("", "0"):
+            return None
+        return cls(
+            track_memory=os.environ.get("TB_PROFILE_MEMORY", "") not in ("", "0"),
+            log_records=os.environ.get("TB_PROFILE_LOG", "") not in ("", "0"),
+            prometheus_path=os.environ.get("TB_PROFILE_PROM") or None,
+        )
+
+    def reset(self):
+        with self._lock:
+            self.records = []
+
+    def close(self):
+        """Stop tracemalloc if this profiler started it."""
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
+
+    def stage(self, name, **dims):
+        return _Stage(self, name, dims)
+
+    @property
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _enter(self, stage):
+        stage.record["parent"] = self._stack[-1].record["stage"] if self._stack else None
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            # The peak is global: remember the enclosing stage's peak before resetting it
+            current, peak = tracemalloc.get_traced_memory()
+            stage._start_memory = current
+            stage._outer_peak = peak
+            stage._inner_peak = 0
+            tracemalloc.reset_peak()
+        self._stack.append(stage)
+
+    def _exit(self, stage):
+        self._stack.pop()
+        if self.track_memory and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, stage._inner_peak)
+            stage.record["peak_bytes"] = max(0, peak - stage._start_memory)
+            if self._stack:
+                outer = self._stack[-1]
+                outer._inner_peak = max(outer._inner_peak, peak, stage._outer_peak)
+        max_rss = peak_rss_bytes()
+        if max_rss is not None:
+            stage.record["max_rss_bytes"] = max_rss
+        with self._lock:
+            self.records.append(stage.record)
+        if self.log_records:
+            logger.info(json.dumps(dict(self.labels, **stage.record), default=str))
+
+    def summary(self):
+        """Records aggregated per stage: summed times, maximum memory, last dimensions."""
+        stages = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            entry = stages.setdefault(record["stage"], {
+                "stage": record["stage"], "calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+            })
+            entry["calls"] += 1
+            entry["wall_seconds"] += record["wall_seconds"]
+            entry["cpu_seconds"] += record["cpu_seconds"]
+            for field in ("peak_bytes", "max_rss_bytes"):
+                if field in record:
+                    entry[field] = max(entry.get(field, 0), record[field])
+            for field in DIMENSION_METRICS:
+                if field in record:
+                    entry[field] = record[field]
+        return list(stages.values())
+
+    def to_json(self):
+        return json.dumps({"labels": self.labels, "stages": self.records}, default=str, indent=2)
+
+    def prometheus_text(self):
+        """The per-stage summary in the Prometheus text exposition format."""
+        return prometheus_text([(self.labels, self.summary())])
+
+    def write_prometheus(self, path=None):
+        """Atomically write the Prometheus text file so a scraper never sees half of it."""
+        path = path or self.prometheus_path
+        if not path:
+            return None
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+        return path
+
+
+PROMETHEUS_METRICS = [
+    ("tb_stage_calls_total", "counter", "calls", "Number of times the pipeline stage ran"),
+    ("tb_stage_wall_seconds", "gauge", "wall_seconds", "Wall time spent in the pipeline stage"),
+    ("tb_stage_cpu_seconds", "gauge", "cpu_seconds", "CPU time of the thread running the pipeline stage"),
+    ("tb_stage_peak_bytes", "gauge", "peak_bytes", "Peak memory traced by tracemalloc during the stage"),
+    ("tb_stage_max_rss_bytes", "gauge", "max_rss_bytes", "Process peak resident set size after the stage"),
+    ("tb_stage_input_rows", "gauge", "rows", "Rows handed to the pipeline stage"),
+    ("tb_stage_input_months", "gauge", "months", "Month columns handed to the pipeline stage"),
+]
+
+
+def prometheus_text(summaries):
+    """Format ``(labels, Profiler.summary())`` pairs as one Prometheus text exposition."""
+    lines = []
+    for metric, metric_type, field, help_text in PROMETHEUS_METRICS:
+        samples = [
+            (dict(labels, stage=entry["stage"]), entry[field])
+            for labels, summary in summaries for entry in summary if field in entry
+        ]
+        if not samples:
+            continue
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+        for labels, value in samples:
+            label_text = ",".join(f'{name}="{_escape_label(label)}"' for name, label in labels.items())
+            lines.append(f"{metric}{{{label_text}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None where it can't be measured."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def megabytes(value):
+    """Bytes as megabytes, passing None (not measured) through."""
+    return None if value is None else value / 1024 / 1024
+
+
+def format_mb(value):
+    """Megabytes for a benchmark table, "-" when not measured."""
+    return "-" if value is None else f"{value:.1f}"
+
+
+def run_benchmark_child(script, *args):
+    """Run ``python script --benchmark-child *args`` in a fresh process; return the JSON it printed last.
+
+    A fresh process per measurement keeps peak RSS and imports of one run
+    from leaking into the next.
+    """
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(script), "--benchmark-child", *(str(arg) for arg in args)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def use_profiler(profiler):
+    """Make ``profiler`` (or None) the active profiler for the current context."""
+    return _active_profiler.set(profiler)
+
+
+def active_profiler():
+    return _active_profiler.get()
+
+
+def profile_stage(name, **dims):
+    """Context manager recording the stage ``name`` on the active profiler, if any."""
+    profiler = _active_profiler.get()
+    if profiler is None:
+        return _NULL_STAGE
+    return profiler.stage(name, **dims)
+
+
+def main(argv=None):
+    from analysis import analyze_trial_balance
+    from ingest import load_trial_balance
+    # The pipeline imports "profiling", not "__main__": activate the profiler there
+    from profiling import Profiler, use_profiler
+
+    parser = argparse.ArgumentParser(description="Profile the analysis pipeline on one trial balance file")
+    parser.add_argument("path", help="trial balance file (Excel, Parquet, Feather/Arrow or CSV)")
+    parser.add_argument("--memory", action="store_true", help="trace peak memory per stage (slower)")
+    parser.add_argument("--report", help="also write the Excel report to this path")
+    parser.add_argument("--prometheus", help="write the Prometheus text file to this path")
+    parser.add_argument("--json", action="store_true", help="print the raw records as JSON")
+    args = parser.parse_args(argv)
+
+    profiler = Profiler(track_memory=args.memory, labels={"file": os.path.basename(args.path)})
+    use_profiler(profiler)
+    with open(args.path, "rb") as f:
+        data = f.read()
+    df, month_columns = load_trial_balance(data, args.path)
+    analysis = analyze_trial_balance(df, month_columns)
+    analysis.summary_findings()
+    if args.report:
+        analysis.write_excel_report(args.report)
+
+    if args.json:
+        print(profiler.to_json())
+    else:
+        print(f"{'stage':<16} {'calls':>5} {'wall s':>9} {'cpu s':>9} {'peak MB':>9} {'rows':>9} {'months':>6}")
+        for entry in profiler.summary():
+            peak = f"{entry['peak_bytes'] / 1024 / 1024:.1f}" if "peak_bytes" in entry else "-"
+            print(f"{entry['stage']:<16} {entry['calls']:>5} {entry['wall_seconds']:>9.4f} {entry['cpu_seconds']:>9.4f} "
+                  f"{peak:>9} {entry.get('rows', '-'):>9} {entry.get('months', '-'):>6}")
+    if args.prometheus:
+        profiler.write_prometheus(args.prometheus)
+    profiler.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Detection of significant month-over-month changes.
+
+``find_significant_changes`` masks the numeric change matrix once and melts
+the exceedances into the long "Perubahan Signifikan" table. Equal changes
+(e.g. the ``inf`` of every zero base) keep their row-major order, so the
+top rows are the same whether or not ``top_k`` is given. With ``top_k``
+only the changes tied with or above the ``top_k``-th largest (found with
+``np.partition``) are sorted instead of every exceedance. Given anomaly scores (see ``anomaly.py``), changes
+whose month scores at or below ``min_score`` are dropped.
+
+Run ``python significant.py --benchmark`` to compare against the original
+iterrows implementation.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from changes import build_change_frames
+
+RESULT_COLUMNS = ["Kategori", "No Akun", "Periode", "Perubahan (%)"]
+SCORE_COLUMN = "Skor Anomali"
+
+
+def _period(col):
+    return col.replace("Perubahan ", "").replace(" (%)", "")
+
+
+def rank_changes(result, top_k=None):
+    """Sort a significant-change table largest first, ties in row-major order, and keep ``top_k`` rows."""
+    result = result.sort_values("Perubahan (%)", ascending=False, kind="stable")
+    return result if top_k is None else result.head(top_k)
+
+
+def top_k_candidates(pct, top_k):
+    """Positions, in order, of the values of ``pct`` tied with or above its ``top_k``-th largest."""
+    if top_k <= 0:
+        return np.array([], dtype=np.intp)
+    if top_k >= len(pct):
+        return np.arange(len(pct))
+    kth = np.partition(pct, len(pct) - top_k)[len(pct) - top_k]
+    return np.flatnonzero(pct >= kth)
+
+
+def find_significant_changes(changes_df, category_filter, threshold=20, top_k=None, scores=None, min_score=None):
+    """Return the changes in ``changes_df[category_filter]`` whose magnitude exceeds ``threshold``.
+
+    Rows are sorted by "Perubahan (%)" descending. When ``top_k`` is given only
+    the ``top_k`` largest changes are returned. ``scores`` is an anomaly score
+    matrix aligned with the change columns of ``changes_df``; when given, the
+    result gets a "Skor Anomali" column and changes scoring ``min_score`` or
+    less are left out. Unscored changes (too little history) are kept.
+    """
+    filtered_df = changes_df[category_filter]
+    change_cols = [col for col in filtered_df.columns if "Perubahan" in col]
+
+    values = filtered_df[change_cols].to_numpy(dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        mask = np.abs(values) > threshold  # NaN compares False
+        if scores is not None:
+            scores = np.asarray(scores)[np.asarray(category_filter, dtype=bool)]
+            mask &= ~(scores <= min_score)
+    # Row-major positions, i.e. the order the iterrows loop visited them
+    row_idx, col_idx = np.nonzero(mask)
+    pct = values[row_idx, col_idx]
+
+    # Index rows by their position among all exceedances, with or without top_k
+    positions = None
+    if top_k is not None:
+        # Ties with the top_k-th value are kept so rank_changes picks the same rows as a full sort
+        selected = top_k_candidates(pct, top_k)
+        row_idx, col_idx, pct = row_idx[selected], col_idx[selected], pct[selected]
+        positions = selected
+
+    periods = np.array([_period(col) for col in change_cols], dtype=object)
+    result = pd.DataFrame({
+        "Kategori": filtered_df["Keterangan"].to_numpy()[row_idx],
+        "No Akun": filtered_df["No Akun"].to_numpy()[row_idx],
+        "Periode": periods[col_idx],
+        "Perubahan (%)": pct,
+    }, columns=RESULT_COLUMNS, index=positions)
+    if scores is not None:
+        result[SCORE_COLUMN] = scores[row_idx, col_idx].astype(np.float64)
+    return rank_changes(result, top_k)
+
+
+# Original implementation, kept as the reference for the benchmark
+def find_significant_changes_iterrows(changes_df, category_filter, threshold=20):
+    filtered_df = changes_df[category_filter].copy()
+    change_cols = [col for col in filtered_df.columns if "Perubahan" in col]
+
+    significant_changes = []
+    for idx, row in filtered_df.iterrows():
+        for col in change_cols:
+            if pd.notna(row[col]) and abs(row[col]) > threshold:
+                period = col.replace("Perubahan ", "").replace(" (%)", "")
+                significant_changes.append({
+                    "Kategori": row["Keterangan"],
+                    "No Akun": row["No Akun"],
+                    "Periode": period,
+                    "Perubahan (%)": row[col]
+                })
+
+    # Stable, unlike the original's default quicksort, so ties keep the order they were visited in
+    return pd.DataFrame(significant_changes).sort_values("Perubahan (%)", ascending=False, kind="stable")
+
+
+def benchmark(rows, months, top_k=1, legacy=True):
+    """Time the implementations on a synthetic ``rows`` x ``months`` trial balance."""
+    from synthetic import synthetic_trial_balance
+
+    df, month_columns = synthetic_trial_balance(rows, months)
+    changes_df, _ = build_change_frames(df, month_columns)
+    category_filter = pd.Series(True, index=changes_df.index)
+    result = {"rows": rows, "months": months}
+
+    start = time.perf_counter()
+    actual = find_significant_changes(changes_df, category_filter)
+    result["vectorized_seconds"] = time.perf_counter() - start
+    result["exceedances"] = len(actual)
+
+    start = time.perf_counter()
+    top = find_significant_changes(changes_df, category_filter, top_k=top_k)
+    result["top_k_seconds"] = time.perf_counter() - start
+    # The same accounts and periods as the head of the full table, not just the same values
+    pd.testing.assert_frame_equal(top, actual.head(top_k))
+
+    if legacy:
+        start = time.perf_counter()
+        expected = find_significant_changes_iterrows(changes_df, category_filter)
+        result["iterrows_seconds"] = time.perf_counter() - start
+        pd.testing.assert_frame_equal(
+            actual.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False
+        )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Significant change detector")
+    parser.add_argument("--benchmark", action="store_true", help="compare against the iterrows implementation")
+    parser.add_argument("--sizes", default="10000x24,100000x60", help="comma-separated ROWSxMONTHS list")
+    parser.add_argument("--top-k", type=int, default=1)
+    parser.add_argument("--skip-legacy", action="store_true", help="don't run the (slow) iterrows implementation")
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    for size in args.sizes.split(","):
+        rows, months = (int(part) for part in size.lower().split("x"))
+        result = benchmark(rows, months, top_k=args.top_k, legacy=not args.skip_legacy)
+        print(f"{rows} akun x {months} bulan: {result['exceedances']} perubahan signifikan")
+        if "iterrows_seconds" in result:
+            print(f"  iterrows:   {result['iterrows_seconds']:.3f} s (outputs identical)")
+        print(f"  vectorized: {result['vectorized_seconds']:.3f} s")
+        print(f"  top-{args.top_k}:      {result['top_k_seconds']:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Color banding of percentage changes.
+
+The whole change matrix is classified once into a compact ``int8`` band
+array (``np.select``): no color for NaN, green within ±green, yellow within
+±yellow, red beyond (including ``inf``). The on-screen tables take their
+CSS straight from that array. The Excel report uses native xlsxwriter
+conditional formats built from the same thresholds instead of a style per
+cell.
+"""
+import os
+
+import numpy as np
+
+NO_BAND, GREEN, YELLOW, RED = 0, 1, 2, 3
+
+# Same colors as the original per-cell styling
+BAND_CSS = np.array([
+    '',
+    'background-color: rgba(0, 255, 0, 0.2)',  # Green
+    'background-color: rgba(255, 255, 0, 0.2)',  # Yellow
+    'background-color: rgba(255, 0, 0, 0.2)',  # Red
+], dtype=object)
+
+# The rgba colors above blended over white, for Excel
+BAND_EXCEL_COLORS = {GREEN: '#CCFFCC', YELLOW: '#FFFFCC', RED: '#FFCCCC'}
+
+
+class BandThresholds:
+    """Absolute percentage limits of the green and yellow bands (inclusive)."""
+
+    def __init__(self, green=5, yellow=20):
+        if not 0 <= green <= yellow:
+            raise ValueError("Thresholds must satisfy 0 <= green <= yellow")
+        self.green = green
+        self.yellow = yellow
+
+    @classmethod
+    def from_env(cls, green_var="TB_BAND_GREEN", yellow_var="TB_BAND_YELLOW"):
+        """Thresholds from the environment, falling back to the defaults."""
+        return cls(float(os.environ.get(green_var, 5)), float(os.environ.get(yellow_var, 20)))
+
+
+DEFAULT_THRESHOLDS = BandThresholds()
+
+
+def band_matrix(values, thresholds=DEFAULT_THRESHOLDS):
+    """Classify a matrix of percentage changes into an ``int8`` band array."""
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        magnitude = np.abs(values)
+        return np.select(
+            [np.isnan(values), magnitude <= thresholds.green, magnitude <= thresholds.yellow],
+            [NO_BAND, GREEN, YELLOW],
+            default=RED,
+        ).astype(np.int8)
+
+
+def band_css(bands):
+    """CSS strings for a band array, shaped like ``bands``."""
+    return BAND_CSS[bands]
+
+
+def style_changes(df, bands, pct_cols):
+    """Return a Styler coloring ``df[pct_cols]`` from precomputed ``bands``."""
+    css = band_css(bands)
+    return df.style.apply(lambda _: css, axis=None, subset=pct_cols)
+
+
+def add_excel_bands(workbook, worksheet, first_row, first_col, last_row, last_col, thresholds=DEFAULT_THRESHOLDS):
+    """Add native conditional formats that reproduce the bands on a cell range."""
+    if last_row < first_row or last_col < first_col:
+        return
+    cell_range = (first_row, first_col, last_row, last_col)
+    # Blank cells are NaN changes: leave them uncolored
+    worksheet.conditional_format(*cell_range, {'type': 'blanks', 'stop_if_true': True})
+    for band, limit in ((GREEN, thresholds.green), (YELLOW, thresholds.yellow)):
+        worksheet.conditional_format(*cell_range, {
+            'type': 'cell', 'criteria': 'between', 'minimum': -limit, 'maximum': limit,
+            'format': workbook.add_format({'bg_color': BAND_EXCEL_COLORS[band]}), 'stop_if_true': True,
+        })
+    # Everything else is red, including the "inf" text cells of zero-base changes
+    worksheet.conditional_format(*cell_range, {
+        'type': 'no_blanks', 'format': workbook.add_format({'bg_color': BAND_EXCEL_COLORS[RED]}),
+    })
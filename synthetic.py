@@ -0,0 +1,154 @@
+"""Deterministic synthetic trial balances for benchmarks.
+
+``synthetic_raw_trial_balance`` builds a trial balance shaped like a real
+upload as ``pd.read_excel`` returns it:
+
+- "No Akun" are 6+ digit codes whose leading digit is the account class
+  (1 aset, 2 kewajiban, 4 pendapatan, 5 biaya), so the prefix rollups have
+  real groups
+- "Keterangan" uses the real category names of ``classifier``: "Biaya ..."
+  expense accounts, the exact pinjaman and simpanan names, and a few other
+  accounts (Kas, Bank, Pendapatan Jasa, ...)
+- amounts are whole rupiah around a per-account level with monthly noise
+  and a slow trend; "Simpanan Hari Raya" and "Simpanan Qurban" swell in
+  their season every year
+- some accounts open later in the period (leading zero months) and some
+  cells are zero or missing (NaN)
+- month headers are Excel dates (``pd.Timestamp``, as read from date
+  cells) or the "%Y-%m-%d %H.%M.%S" text of ``parsing.DEFAULT_DATE_FORMAT``
+
+The same ``seed`` always gives the same table. ``synthetic_trial_balance``
+returns it normalized (float64 months, ``mmm-yyyy`` headers) and
+``write_synthetic_workbook`` writes it to an xlsx file.
+"""
+import numpy as np
+import pandas as pd
+
+from classifier import DEFAULT_CATEGORIES
+from parsing import DEFAULT_DATE_FORMAT, format_month_headers
+
+OTHER_ACCOUNTS = {
+    1: ["Kas", "Bank", "Piutang Lain-lain", "Inventaris Kantor"],
+    2: ["Hutang Lain-lain", "Cadangan Resiko"],
+    4: ["Pendapatan Jasa", "Pendapatan Bunga Pinjaman", "Pendapatan Administrasi"],
+}
+
+# Account class and share of the rows of each kind of account
+ACCOUNT_MIX = (
+    ("expense", 5, 0.4),
+    ("pinjaman", 1, 0.15),
+    ("simpanan", 2, 0.15),
+    ("other", None, 0.3),
+)
+
+# Month (1-12) in which a seasonal account peaks, and how much
+SEASONAL_PEAKS = {"Simpanan Hari Raya": (4, 3.0), "Simpanan Qurban": (7, 2.0)}
+
+
+def _account_names(kind, count, rng):
+    if kind == "expense":
+        names = [f"Biaya {name}" for name in DEFAULT_CATEGORIES["expense"]["names"]]
+    elif kind == "other":
+        names = [name for group in OTHER_ACCOUNTS.values() for name in group]
+    else:
+        names = list(DEFAULT_CATEGORIES[kind]["names"])
+    return np.asarray(names, dtype=object)[rng.integers(0, len(names), size=count)]
+
+
+def _account_classes(kind, account_class, names):
+    if kind != "other":
+        return np.full(len(names), account_class)
+    classes = {name: account_class for account_class, group in OTHER_ACCOUNTS.items() for name in group}
+    return np.array([classes[name] for name in names])
+
+
+def synthetic_raw_trial_balance(rows, months, seed=0, nan_rate=0.05, zero_rate=0.03, late_rate=0.05,
+                                header_style="datetime", start="2020-01-01"):
+    """A raw ``rows`` x ``months`` trial balance upload; see the module docstring."""
+    rng = np.random.default_rng(seed)
+
+    names, classes = [], []
+    counts = rng.multinomial(rows, [share for _, _, share in ACCOUNT_MIX])
+    for (kind, account_class, _), count in zip(ACCOUNT_MIX, counts):
+        kind_names = _account_names(kind, count, rng)
+        names.append(kind_names)
+        classes.append(_account_classes(kind, account_class, kind_names))
+    names = np.concatenate(names)
+    classes = np.concatenate(classes)
+    order = rng.permutation(rows)
+    names, classes = names[order], classes[order]
+
+    # Unique codes: class digit, then numbers spread evenly over the class's range
+    digits = max(6, len(str(rows)) + 1)
+    codes = np.empty(rows, dtype=np.int64)
+    for account_class in np.unique(classes):
+        in_class = np.flatnonzero(classes == account_class)
+        step = (10 ** (digits - 1) - 1) // (len(in_class) + 1)
+        codes[in_class] = account_class * 10 ** (digits - 1) + step * np.arange(1, len(in_class) + 1)
+
+    dates = pd.date_range(start, periods=months, freq="MS")
+    level = 10 ** rng.uniform(5, 9, size=(rows, 1))
+    trend = 1 + rng.normal(0, 0.005, size=(rows, 1)) * np.arange(months)
+    noise = rng.normal(1, 0.08, size=(rows, months))
+    values = level * np.maximum(trend, 0.1) * np.abs(noise)
+    for name, (month, factor) in SEASONAL_PEAKS.items():
+        values[np.ix_(names == name, np.asarray(dates.month == month))] *= factor
+    values = np.round(values)
+
+    # Accounts opened during the period have zero balances before that, i.e. zero bases
+    late = np.flatnonzero(rng.random(rows) < late_rate)
+    opened = rng.integers(1, max(2, months), size=len(late))
+    values[late[:, None], np.arange(months)] *= np.arange(months) >= opened[:, None]
+    values[rng.random((rows, months)) < zero_rate] = 0
+    values[rng.random((rows, months)) < nan_rate] = np.nan
+
+    if header_style == "datetime":
+        headers = list(dates)
+    else:
+        headers = [d.strftime(DEFAULT_DATE_FORMAT) for d in dates]
+    raw = pd.DataFrame(values, columns=range(months))
+    raw.columns = headers
+    raw.insert(0, "Keterangan", names)
+    raw.insert(0, "No Akun", codes)
+    return raw
+
+
+def synthetic_trial_balance(rows, months, seed=0, **options):
+    """A normalized ``(df, month_columns)`` with float64 months and ``mmm-yyyy`` headers."""
+    raw = synthetic_raw_trial_balance(rows, months, seed=seed, **options)
+    month_columns = format_month_headers(raw.columns[2:])
+    raw.columns = ["No Akun", "Keterangan"] + month_columns
+    return raw, month_columns
+
+
+def write_synthetic_workbook(path, raw, text_rate=0.0, seed=0):
+    """Write ``raw`` to an xlsx file; ``text_rate`` of the amounts are typed as Indonesian text."""
+    import xlsxwriter
+
+    rng = np.random.default_rng(seed)
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    worksheet = workbook.add_worksheet()
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+    for j, header in enumerate(raw.columns):
+        if isinstance(header, pd.Timestamp):
+            worksheet.write_datetime(0, j, header.to_pydatetime(), date_format)
+        else:
+            worksheet.write(0, j, header)
+
+    codes = raw["No Akun"].tolist()
+    names = raw["Keterangan"].tolist()
+    values = raw.iloc[:, 2:].to_numpy(dtype=np.float64)
+    as_text = rng.random(values.shape) < text_rate
+    for i in range(len(raw)):
+        worksheet.write_number(i + 1, 0, codes[i])
+        worksheet.write_string(i + 1, 1, names[i])
+        for j, value in enumerate(values[i].tolist()):
+            if value != value:
+                continue  # NaN stays a blank cell
+            if as_text[i, j]:
+                # e.g. "1.234.567"
+                worksheet.write_string(i + 1, j + 2, f"{value:,.0f}".replace(",", "."))
+            else:
+                worksheet.write_number(i + 1, j + 2, value)
+    workbook.close()
+    return path
@@ -0,0 +1,85 @@
+"""Server-side paginated views over large tables.
+
+A ``TableView`` wraps one normalized frame, optionally restricted to a
+subset of its row positions (e.g. one category) without copying. Filtering, sorting and column
+projection are done on the server and only the requested page is
+materialized, converted to Arrow and sent to the browser, so the payload
+per interaction is bounded by the page size rather than the file size.
+The row order of each (filter, sort) combination is cached, so paging
+through a sorted view only slices.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from export import arrow_table
+
+PAGE_SIZES = (25, 50, 100, 250)
+
+
+class TableView:
+    """Filter, sort and page through ``df`` (or its ``rows`` positions) without copying it."""
+
+    def __init__(self, df, filter_columns=("No Akun", "Keterangan"), max_orderings=16, rows=None):
+        self.df = df
+        self.rows = np.arange(len(df)) if rows is None else np.asarray(rows, dtype=np.intp)
+        self.filter_columns = [col for col in filter_columns if col in df.columns]
+        self._orderings = LRUCache(max_entries=max_orderings)
+        self._search_text = None
+
+    @property
+    def columns(self):
+        return list(self.df.columns)
+
+    def _text(self):
+        # Lowercased searchable text per row, built once on the first filter
+        if self._search_text is None:
+            text = pd.Series("", index=range(len(self.rows)), dtype=object)
+            for col in self.filter_columns:
+                text = text + " " + self.df[col].iloc[self.rows].astype(str).str.lower().to_numpy()
+            self._search_text = text
+        return self._search_text
+
+    def ordering(self, sort_by=None, ascending=True, filter_text=None):
+        """Positions in ``df`` of the rows matching ``filter_text``, ordered by ``sort_by``."""
+        filter_text = (filter_text or "").strip().lower()
+        key = (sort_by, bool(ascending), filter_text)
+        positions = self._orderings.get(key)
+        if positions is not None:
+            return positions
+
+        positions = self.rows
+        if filter_text:
+            positions = positions[self._text().str.contains(filter_text, regex=False).to_numpy()]
+        if sort_by is not None:
+            values = self.df[sort_by].iloc[positions].reset_index(drop=True)
+            try:
+                order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index
+            except TypeError:
+                # Mixed ints and strings, e.g. in "No Akun"
+                order = values.astype(str).sort_values(ascending=ascending, kind="stable").index
+            positions = positions[order.to_numpy()]
+
+        self._orderings.put(key, positions)
+        return positions
+
+    def window(self, page, page_size, sort_by=None, ascending=True, filter_text=None):
+        """Return ``(positions, total_rows, page_count)`` of the rows on a 0-based ``page``."""
+        positions = self.ordering(sort_by, ascending, filter_text)
+        total_rows = len(positions)
+        page_count = max(1, math.ceil(total_rows / page_size))
+        page = min(max(page, 0), page_count - 1)
+        return positions[page * page_size:(page + 1) * page_size], total_rows, page_count
+
+    def page(self, page, page_size, columns=None, sort_by=None, ascending=True, filter_text=None):
+        """Return ``(page_df, total_rows, page_count)`` for a 0-based ``page``."""
+        window, total_rows, page_count = self.window(page, page_size, sort_by, ascending, filter_text)
+        columns = self.columns if not columns else [col for col in self.columns if col in columns]
+        return self.df.iloc[window][columns], total_rows, page_count
+
+    def page_arrow(self, *args, **kwargs):
+        """Like ``page`` but returns the page as an Arrow table."""
+        page_df, total_rows, page_count = self.page(*args, **kwargs)
+        return arrow_table(page_df), total_rows, page_count